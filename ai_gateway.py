@@ -0,0 +1,173 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+import aiohttp
+
+# --- AI 예측 VM 게이트웨이 ---
+# 짧은 시간(AI_BATCH_WINDOW) 안에 들어온 예측 요청을 모아 VM에 한 번에 보내고(/predict/batch),
+# 결과는 (종목, 거래일) 단위로 LRU 캐시에 보관합니다. 같은 요청이 진행 중이면 그 결과를 함께 기다리고,
+# VM이 밀려 있으면 새 요청을 쌓지 않고 캐시된 결과를 주거나 PredictorBusy(429)로 거절합니다.
+
+KST = ZoneInfo("Asia/Seoul")
+AI_BATCH_WINDOW = float(os.getenv("AI_BATCH_WINDOW_MS", "20")) / 1000
+AI_MAX_BATCH_SIZE = int(os.getenv("AI_MAX_BATCH_SIZE", "16"))
+AI_MAX_CONCURRENCY = int(os.getenv("AI_MAX_CONCURRENCY", "2"))  # VM에 동시에 보내는 호출 수
+AI_MAX_PENDING = int(os.getenv("AI_MAX_PENDING", "128"))  # 응답을 기다리는 서로 다른 요청 수 상한
+AI_CACHE_MAX_ENTRIES = int(os.getenv("AI_CACHE_MAX_ENTRIES", "512"))
+AI_REQUEST_TIMEOUT = float(os.getenv("AI_REQUEST_TIMEOUT", "10"))
+AI_BATCH_PATH = os.getenv("AI_BATCH_PATH", "/predict/batch")
+
+# 배치 엔드포인트가 없는 VM이 돌려주는 상태 코드. 이후에는 건별 /predict 호출로 대신합니다.
+BATCH_UNSUPPORTED_STATUS = {404, 405, 501}
+
+
+class PredictorBusy(Exception):
+    pass
+
+
+class PredictorUnavailable(Exception):
+    pass
+
+
+def trading_day(now: datetime | None = None) -> str:
+    # 주말에는 직전 금요일 예측을 그대로 씁니다(휴장일은 따로 구분하지 않음).
+    day = (now or datetime.now(KST)).date()
+    while day.weekday() >= 5: day -= timedelta(days=1)
+    return day.strftime("%Y%m%d")
+
+
+class PredictorGateway:
+    def __init__(self, base_url: str, batch_window: float = AI_BATCH_WINDOW, max_batch_size: int = AI_MAX_BATCH_SIZE,
+                 max_concurrency: int = AI_MAX_CONCURRENCY, max_pending: int = AI_MAX_PENDING, cache_size: int = AI_CACHE_MAX_ENTRIES,
+                 timeout: float = AI_REQUEST_TIMEOUT):
+        self.base_url = base_url.rstrip("/")
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+        self.max_concurrency = max_concurrency
+        self.max_pending = max_pending
+        self.cache_size = cache_size
+        self.timeout = timeout
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.session: aiohttp.ClientSession | None = None
+        self.batch_supported = True
+        # (종목, 거래일) -> 예측 결과. 가장 오래 사용되지 않은 항목이 앞쪽에 위치합니다.
+        self.cache: OrderedDict[tuple[str, str], dict] = OrderedDict()
+        # 종목별 마지막 예측 결과. VM이 밀려 있을 때 지난 거래일 결과라도 돌려주기 위해 둡니다.
+        self.last_by_symbol: OrderedDict[str, dict] = OrderedDict()
+        self.inflight: dict[tuple[str, str], asyncio.Future] = {}
+        self.pending: list[tuple[tuple[str, str], str, float, asyncio.Future]] = []
+        self.flush_handle: asyncio.TimerHandle | None = None
+        self.tasks: set[asyncio.Task] = set()
+        self.stats = {"requests": 0, "hits": 0, "coalesced": 0, "stale_served": 0, "rejected": 0, "batches": 0, "batched_requests": 0,
+                      "vm_calls": 0, "vm_errors": 0, "vm_ms_total": 0.0}
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency * self.max_batch_size, keepalive_timeout=60)
+            self.session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self.session
+
+    async def close(self):
+        if self.flush_handle is not None: self.flush_handle.cancel(); self.flush_handle = None
+        for task in list(self.tasks): task.cancel()
+        if self.session is not None and not self.session.closed: await self.session.close()
+        self.session = None
+
+    def _remember(self, key: tuple[str, str], result: dict):
+        self.cache[key] = result; self.cache.move_to_end(key)
+        if len(self.cache) > self.cache_size: self.cache.popitem(last=False)
+        self.last_by_symbol[key[0]] = result; self.last_by_symbol.move_to_end(key[0])
+        if len(self.last_by_symbol) > self.cache_size: self.last_by_symbol.popitem(last=False)
+
+    async def predict(self, stock_code: str, last_close: float) -> dict:
+        self.stats["requests"] += 1
+        key = (stock_code, trading_day())
+        result = self.cache.get(key)
+        if result is not None:
+            self.cache.move_to_end(key); self.stats["hits"] += 1
+            return result
+        future = self.inflight.get(key)
+        if future is not None:
+            self.stats["coalesced"] += 1
+        else:
+            if len(self.inflight) >= self.max_pending:
+                stale = self.last_by_symbol.get(stock_code)
+                if stale is not None:
+                    self.stats["stale_served"] += 1
+                    return {**stale, "stale": True}
+                self.stats["rejected"] += 1
+                raise PredictorBusy(f"대기 중인 예측 요청이 {len(self.inflight)}건입니다.")
+            future = self.inflight[key] = asyncio.get_running_loop().create_future()
+            # 기다리던 클라이언트가 모두 연결을 끊어도 "exception was never retrieved" 경고가 나지 않도록 합니다.
+            future.add_done_callback(lambda f: f.cancelled() or f.exception())
+            self.pending.append((key, stock_code, last_close, future))
+            if len(self.pending) >= self.max_batch_size: self._flush()
+            elif self.flush_handle is None: self.flush_handle = asyncio.get_running_loop().call_later(self.batch_window, self._flush)
+        # 한 클라이언트의 요청이 취소되어도 함께 기다리는 다른 요청에는 영향이 없도록 shield로 감쌉니다.
+        return await asyncio.shield(future)
+
+    def _flush(self):
+        if self.flush_handle is not None: self.flush_handle.cancel(); self.flush_handle = None
+        while self.pending:
+            batch, self.pending = self.pending[:self.max_batch_size], self.pending[self.max_batch_size:]
+            task = asyncio.create_task(self._run_batch(batch))
+            self.tasks.add(task); task.add_done_callback(self.tasks.discard)
+
+    async def _run_batch(self, batch: list):
+        try:
+            started = time.perf_counter()
+            try: results = await self._call_vm([{"stock_code": code, "last_close": last_close} for _, code, last_close, _ in batch])
+            except Exception as e:
+                self.stats["vm_errors"] += 1
+                print(f"!!! AI VM 연결 실패: {e}")
+                error = PredictorUnavailable(str(e))
+                for _, _, _, future in batch:
+                    if not future.done(): future.set_exception(error)
+                return
+            finally: self.stats["vm_ms_total"] += (time.perf_counter() - started) * 1000
+            self.stats["batches"] += 1; self.stats["batched_requests"] += len(batch)
+            for (key, code, _, future), result in zip(batch, results):
+                # 건별 호출에서는 실패한 종목만 오류로 돌려주고, 성공한 결과만 캐시합니다.
+                if isinstance(result, Exception):
+                    self.stats["vm_errors"] += 1
+                    print(f"!!! AI VM 예측 실패 ({code}): {result}")
+                    if not future.done(): future.set_exception(PredictorUnavailable(str(result)))
+                    continue
+                self._remember(key, result)
+                if not future.done(): future.set_result(result)
+        finally:
+            for key, _, _, future in batch:
+                if self.inflight.get(key) is future: del self.inflight[key]
+                if not future.done(): future.cancel()
+
+    async def _post(self, path: str, body) -> dict | list:
+        # 배치 호출이든 건별 호출이든 VM에 동시에 보내는 호출 수는 max_concurrency를 넘지 않습니다.
+        async with self.semaphore:
+            self.stats["vm_calls"] += 1
+            async with self._get_session().post(f"{self.base_url}{path}", json=body) as res:
+                res.raise_for_status()
+                return await res.json(content_type=None)
+
+    async def _call_vm(self, requests: list[dict]) -> list[dict | Exception]:
+        if len(requests) > 1 and self.batch_supported:
+            try:
+                data = await self._post(AI_BATCH_PATH, {"requests": requests})
+                predictions = data.get("predictions") if isinstance(data, dict) else data
+                if not isinstance(predictions, list) or len(predictions) != len(requests):
+                    raise PredictorUnavailable("배치 응답의 예측 결과 수가 요청 수와 다릅니다.")
+                return predictions
+            except aiohttp.ClientResponseError as e:
+                if e.status not in BATCH_UNSUPPORTED_STATUS: raise
+                # 여러 배치가 동시에 전환되어도 안내는 한 번만 남깁니다.
+                if self.batch_supported:
+                    self.batch_supported = False
+                    print(f"⚠️ AI VM이 배치 예측({AI_BATCH_PATH})을 지원하지 않아 건별 호출로 전환합니다.")
+        return await asyncio.gather(*(self._post("/predict", request) for request in requests), return_exceptions=True)
+
+    def snapshot_stats(self) -> dict:
+        return {**self.stats, "cached": len(self.cache), "inflight": len(self.inflight), "batch_supported": self.batch_supported,
+                "avg_batch_size": self.stats["batched_requests"] / self.stats["batches"] if self.stats["batches"] else 0.0}
@@ -0,0 +1,123 @@
+import os
+from collections import deque
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from tick_codec import Tick
+
+# --- 실시간 틱 → OHLCV 봉 집계 ---
+# 종목별로 1분/5분/1시간 봉을 틱이 들어올 때마다 갱신하고, 완성된 봉은 고정 크기 링 버퍼에 보관합니다.
+
+KST = ZoneInfo("Asia/Seoul")
+BAR_INTERVALS = {"1m": 60, "5m": 300, "1h": 3600}
+# 정규장 하루(6시간 30분) 기준으로 1분봉 2일, 5분봉 약 6일, 1시간봉 약 28일치를 보관합니다.
+BAR_CAPACITY = {"1m": int(os.getenv("BAR_CAPACITY_1M", "800")), "5m": int(os.getenv("BAR_CAPACITY_5M", "500")), "1h": int(os.getenv("BAR_CAPACITY_1H", "200"))}
+# 봉 종료 시각 이후 이 시간 동안은 늦게 도착한 틱을 기다렸다가 봉을 확정합니다.
+BAR_FINALIZE_GRACE = float(os.getenv("BAR_FINALIZE_GRACE", "2"))
+
+
+class Bar:
+    __slots__ = ("start", "open", "high", "low", "close", "volume", "change", "changeRate")
+
+    def __init__(self, start: int, tick: Tick):
+        self.start = start  # 봉 시작 시각 (epoch 초)
+        self.open = self.high = self.low = self.close = tick.price
+        self.volume = tick.volume
+        self.change = tick.change; self.changeRate = tick.changeRate
+
+    def update(self, tick: Tick):
+        price = tick.price
+        if price > self.high: self.high = price
+        if price < self.low: self.low = price
+        self.close = price
+        self.volume += tick.volume
+        self.change = tick.change; self.changeRate = tick.changeRate
+
+    def to_record(self) -> dict:
+        date = datetime.fromtimestamp(self.start, KST).strftime("%Y-%m-%d %H:%M:%S")
+        return {"date": date, "open": self.open, "high": self.high, "low": self.low, "close": self.close, "volume": self.volume}
+
+
+class BarSeries:
+    def __init__(self, interval_sec: int, capacity: int):
+        self.interval_sec = interval_sec
+        self.bars: deque[Bar] = deque(maxlen=capacity)
+        self.current: Bar | None = None
+
+
+class BarAggregator:
+    def __init__(self, intervals: dict = BAR_INTERVALS, capacity: dict = BAR_CAPACITY):
+        self.intervals = intervals
+        self.capacity = capacity
+        # (tr_id, 코드) -> interval -> BarSeries
+        self.series: dict[tuple[str, str], dict[str, BarSeries]] = {}
+        # (tr_id, 코드) -> 집계를 시작한 첫 틱의 시각(epoch 초). 이보다 앞선 구간의 봉은 메모리에 없습니다.
+        self.started_at: dict[tuple[str, str], int] = {}
+        self.midnight_key: str | None = None
+        self.midnight_epoch = 0
+
+    def _tick_epoch(self, hhmmss: str) -> int:
+        # KIS 체결 시각은 HHMMSS(한국시간)만 오므로 오늘 날짜 기준 epoch 초로 변환합니다.
+        now = datetime.now(KST)
+        today = now.strftime("%Y%m%d")
+        if today != self.midnight_key:
+            self.midnight_key = today
+            self.midnight_epoch = int(now.replace(hour=0, minute=0, second=0, microsecond=0).timestamp())
+        return self.midnight_epoch + int(hhmmss[0:2]) * 3600 + int(hhmmss[2:4]) * 60 + int(hhmmss[4:6])
+
+    def on_tick(self, tick: Tick) -> list[tuple[str, Bar]]:
+        """틱을 반영하고, 이번 틱으로 완성된 (interval, Bar) 목록을 돌려줍니다."""
+        if len(tick.time) < 6 or not tick.time[:6].isdigit() or tick.price <= 0: return []
+        epoch = self._tick_epoch(tick.time)
+        key = (tick.tr_id, tick.code)
+        by_interval = self.series.get(key)
+        if by_interval is None:
+            by_interval = self.series[key] = {name: BarSeries(sec, self.capacity[name]) for name, sec in self.intervals.items()}
+            self.started_at[key] = epoch
+        finalized = []
+        for name, series in by_interval.items():
+            start = epoch - epoch % series.interval_sec
+            current = series.current
+            if current is not None and current.start == start:
+                current.update(tick); continue
+            if current is not None and start < current.start: continue  # 이미 지난 구간의 늦은 틱은 버립니다.
+            if current is not None:
+                series.bars.append(current); finalized.append((name, current))
+            elif series.bars and start <= series.bars[-1].start: continue  # 시간 기준으로 이미 확정된 구간
+            series.current = Bar(start, tick)
+        return finalized
+
+    def flush_expired(self, now_epoch: float) -> list[tuple[tuple[str, str], str, Bar]]:
+        """틱이 뜸한 종목도 봉이 제때 확정되도록, 종료 시각이 지난 현재 봉을 확정합니다."""
+        finalized = []
+        for key, by_interval in self.series.items():
+            for name, series in by_interval.items():
+                current = series.current
+                if current is not None and current.start + series.interval_sec + BAR_FINALIZE_GRACE <= now_epoch:
+                    series.bars.append(current); series.current = None
+                    finalized.append((key, name, current))
+        return finalized
+
+    def is_tracking(self, key: tuple[str, str]) -> bool:
+        return key in self.series
+
+    def tracking_since(self, key: tuple[str, str]) -> int | None:
+        return self.started_at.get(key)
+
+    def drop(self, key: tuple[str, str]):
+        # 구독이 끊긴 종목은 이후 봉을 채울 수 없으므로 버리고, 다시 구독하면 처음부터 집계합니다.
+        self.series.pop(key, None); self.started_at.pop(key, None)
+
+    def bars(self, key: tuple[str, str], interval: str, since_epoch: int = 0, include_current: bool = True) -> list[Bar]:
+        series = self.series.get(key, {}).get(interval)
+        if series is None: return []
+        bars = [bar for bar in series.bars if bar.start >= since_epoch]
+        if include_current and series.current is not None and series.current.start >= since_epoch: bars.append(series.current)
+        return bars
+
+    def current_bar(self, key: tuple[str, str], interval: str) -> Bar | None:
+        series = self.series.get(key, {}).get(interval)
+        return series.current if series is not None else None
+
+    def today_start_epoch(self) -> int:
+        return int(datetime.now(KST).replace(hour=0, minute=0, second=0, microsecond=0).timestamp())
@@ -0,0 +1,134 @@
+import asyncio
+import json
+import multiprocessing
+import os
+import statistics
+import sys
+import time
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ai_gateway import PredictorGateway, PredictorBusy
+
+# 인위적인 지연이 있는 로컬 모델 서버로 /ai/predict 전달 방식을 비교합니다.
+# 실행: python benchmarks/bench_ai_gateway.py [동시 요청 수]
+
+USERS = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+SYMBOLS = [f"{code:06d}" for code in range(5930, 5930 + 100)]
+
+
+class StubModelServer:
+    """호출당 base_latency + 건당 per_item, GPU 하나처럼 동시에 workers건만 처리하는 예측 서버."""
+    def __init__(self, base_latency: float = 0.2, per_item: float = 0.01, workers: int = 2, batch: bool = True):
+        self.base_latency = base_latency
+        self.per_item = per_item
+        self.workers = workers
+        self.batch = batch
+        self.counter = multiprocessing.Value("i", 0)
+        self.port = 0
+        self.process = None
+
+    @property
+    def base_url(self): return f"http://127.0.0.1:{self.port}"
+
+    @staticmethod
+    def prediction(request: dict) -> dict:
+        last_close = float(request["last_close"])
+        return {"range": [last_close * 0.99, last_close * 1.02], "analysis": f"{request['stock_code']} 분석", "reason": "...", "positiveFactors": [], "potentialRisks": []}
+
+    async def handle(self, reader, writer, gpu):
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                lines = head.decode("latin-1").split("\r\n")
+                path = lines[0].split(" ")[1]
+                length = next((int(line.split(":", 1)[1]) for line in lines[1:] if line.lower().startswith("content-length:")), 0)
+                body = json.loads(await reader.readexactly(length)) if length else {}
+                with self.counter.get_lock(): self.counter.value += 1
+                if path == "/predict/batch" and self.batch:
+                    async with gpu: await asyncio.sleep(self.base_latency + self.per_item * len(body["requests"]))
+                    status, payload = "200 OK", {"predictions": [self.prediction(request) for request in body["requests"]]}
+                elif path == "/predict":
+                    async with gpu: await asyncio.sleep(self.base_latency + self.per_item)
+                    status, payload = "200 OK", self.prediction(body)
+                else:
+                    status, payload = "404 Not Found", {"detail": "Not Found"}
+                data = json.dumps(payload).encode()
+                writer.write(f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\nContent-Length: {len(data)}\r\n\r\n".encode() + data)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError): pass
+        finally: writer.close()
+
+    def _run(self, port_pipe):
+        loop = asyncio.new_event_loop(); asyncio.set_event_loop(loop)
+        gpu = asyncio.Semaphore(self.workers)
+        server = loop.run_until_complete(asyncio.start_server(lambda r, w: self.handle(r, w, gpu), "127.0.0.1", 0, backlog=1024))
+        port_pipe.send(server.sockets[0].getsockname()[1])
+        loop.run_forever()
+
+    def start(self):
+        parent_end, child_end = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=self._run, args=(child_end,), daemon=True); self.process.start()
+        self.port = parent_end.recv(); return self
+
+    def stop(self):
+        self.process.terminate(); self.process.join(timeout=5)
+
+
+async def legacy_predict(base_url: str, stock_code: str, last_close: float):
+    # 기존 ai_predict: async 핸들러 안에서 blocking requests.post
+    res = requests.post(f"{base_url}/predict", json={"stock_code": stock_code, "last_close": last_close}, timeout=10)
+    res.raise_for_status(); return res.json()
+
+
+async def run_burst(name: str, predict, codes: list[str], server: StubModelServer):
+    before_calls = server.counter.value
+    latencies, rejected = [], 0
+
+    # 모든 요청이 동시에 도착했다고 보고, 응답 지연은 폭주 시작 시각부터 잽니다(이벤트 루프가 막혀 기다린 시간 포함).
+    async def one(code):
+        nonlocal rejected
+        try: await predict(code, 70000.0)
+        except PredictorBusy: rejected += 1; return
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(code) for code in codes))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99)] if latencies else 0
+    print(f"{name:<34}{elapsed:7.2f}s  p50 {statistics.median(latencies) if latencies else 0:7.0f}ms  p99 {p99:7.0f}ms  "
+          f"VM 호출 {server.counter.value - before_calls:4d}  429 {rejected:4d}")
+
+
+async def main():
+    codes = [SYMBOLS[i % len(SYMBOLS)] for i in range(USERS)]
+    print(f"동시 요청 {USERS}건 ({len(set(codes))}종목), 모델 지연 200ms + 10ms/건, 동시 처리 2")
+    server = StubModelServer().start()
+    try:
+        await run_burst("before: blocking requests.post", lambda code, close: legacy_predict(server.base_url, code, close), codes[:40], server)
+        print(f"    (before는 {USERS}건 대신 40건만 측정)")
+
+        gateway = PredictorGateway(server.base_url)
+        await run_burst("after: 배치 + single-flight (cold)", gateway.predict, codes, server)
+        await run_burst("after: 같은 요청 반복 (cache)", gateway.predict, codes, server)
+        await gateway.close()
+
+        overload = PredictorGateway(server.base_url, max_pending=32)
+        burst = [f"{code:06d}" for code in range(100000, 100000 + 500)]
+        await run_burst("after: 신규 500종목 폭주 (pending 32)", overload.predict, burst, server)
+        print(f"    {overload.snapshot_stats()}")
+        await overload.close()
+    finally: server.stop()
+
+    server = StubModelServer(batch=False).start()
+    try:
+        gateway = PredictorGateway(server.base_url)
+        await run_burst("after: 배치 미지원 VM (건별 전환)", gateway.predict, codes, server)
+        await gateway.close()
+    finally: server.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
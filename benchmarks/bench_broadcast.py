@@ -0,0 +1,97 @@
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+os.environ.setdefault("CLIENT_SEND_TIMEOUT", "1")
+os.environ.setdefault("CLIENT_STALL_TIMEOUT", "2")
+os.environ.setdefault("CLIENT_QUEUE_SIZE", "32")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from connection_manager import ConnectionManager
+
+# 연결 5,000개(일부는 일부러 느리거나 멈춘 클라이언트)에 틱을 뿌릴 때의 broadcast 지연을 비교합니다.
+# 실행: python benchmarks/bench_broadcast.py [연결 수] [느린 비율] [멈춘 비율]
+
+CONNECTIONS = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+SLOW_RATIO = float(sys.argv[2]) if len(sys.argv) > 2 else 0.02
+STALLED_RATIO = float(sys.argv[3]) if len(sys.argv) > 3 else 0.005
+SYMBOLS = [f"{code:06d}" for code in range(5930, 5930 + 20)]
+TICKS_PER_SEC = 100
+DURATION = 3.0
+
+
+class SimulatedWebSocket:
+    def __init__(self, delay: float, latencies: list | None):
+        self.delay = delay  # None이면 send가 영원히 끝나지 않는 멈춘 클라이언트
+        self.latencies = latencies
+        self.received = 0
+    async def accept(self): pass
+    async def close(self, code: int = 1000): pass
+    async def send_text(self, message: str):
+        if self.delay is None: await asyncio.Future()
+        if self.delay: await asyncio.sleep(self.delay)
+        self.received += 1
+        if self.latencies is not None:
+            self.latencies.append(time.perf_counter() - float(message.rsplit("|", 1)[1]))
+
+
+def make_clients(latencies, include_stalled=True):
+    clients = []
+    for i in range(CONNECTIONS):
+        if include_stalled and i < CONNECTIONS * STALLED_RATIO: clients.append(SimulatedWebSocket(None, None))
+        elif i % int(1 / SLOW_RATIO) == 1: clients.append(SimulatedWebSocket(0.05, None))
+        else: clients.append(SimulatedWebSocket(0, latencies if i % 50 == 0 else None))  # 정상 클라이언트 중 일부만 지연을 기록
+    return clients
+
+
+def percentile(values, p):
+    values = sorted(values); return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def report(name, call_times, latencies):
+    print(f"{name:<24} broadcast 호출 p50={statistics.median(call_times) * 1000:8.2f}ms p99={percentile(call_times, 0.99) * 1000:8.2f}ms | "
+          f"정상 클라이언트 수신 지연 p50={statistics.median(latencies) * 1000:8.1f}ms p99={percentile(latencies, 0.99) * 1000:8.1f}ms")
+
+
+async def legacy_broadcast(clients, message):
+    # 기존 ConnectionManager.broadcast: 연결마다 순서대로 send_text를 기다립니다.
+    for connection in clients: await connection.send_text(message)
+
+
+async def run_legacy():
+    # 멈춘 클라이언트가 있으면 기존 방식은 영원히 끝나지 않으므로 느린 클라이언트만 포함합니다.
+    latencies = []; clients = make_clients(latencies, include_stalled=False); call_times = []
+    for seq in range(10):
+        message = f"tick|{SYMBOLS[seq % len(SYMBOLS)]}|{time.perf_counter()}"
+        started = time.perf_counter(); await legacy_broadcast(clients, message); call_times.append(time.perf_counter() - started)
+    report("before (sequential)", call_times, latencies)
+
+
+async def run_queued():
+    latencies = []; clients = make_clients(latencies); call_times = []
+    manager = ConnectionManager(hub=None)
+    for client in clients: await manager.connect(client)
+    seq = 0; deadline = time.perf_counter() + DURATION
+    while time.perf_counter() < deadline:
+        symbol = SYMBOLS[seq % len(SYMBOLS)]; seq += 1
+        started = time.perf_counter()
+        manager.broadcast(f"tick|{symbol}|{time.perf_counter()}", key=("H0STCNT0", symbol))
+        call_times.append(time.perf_counter() - started)
+        await asyncio.sleep(1 / TICKS_PER_SEC)
+    stats_during = manager.snapshot_stats()
+    await asyncio.sleep(1.5)
+    report("after (per-client queue)", call_times, latencies)
+    print(f"  틱 {seq}건, 측정 중 큐 깊이 합계 {stats_during['queue_depth_total']}, 최대 {stats_during['queue_depth_max']}, 밀린 클라이언트 {stats_during['lagging_clients']}")
+    print(f"  최종: {manager.snapshot_stats()}")
+    for client in list(manager.channels): await manager.disconnect(client)
+
+
+async def main():
+    print(f"연결 {CONNECTIONS}개 (느린 클라이언트 {SLOW_RATIO:.1%}: send 50ms, 멈춘 클라이언트 {STALLED_RATIO:.1%})")
+    await run_legacy()
+    await run_queued()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,68 @@
+import os
+import sys
+import time
+
+import numpy as np
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from chart_payload import brotli, compress, downsample, encode_json, columnar_payload, records_payload, orjson
+
+# 봉 개수별로 차트 응답 크기와 직렬화 시간을 비교합니다.
+# 실행: python benchmarks/bench_chart_payload.py [최대 표시 점 수]
+
+MAX_POINTS = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+SIZES = (1_000, 10_000, 100_000)
+
+
+def make_bars(n: int):
+    rng = np.random.default_rng(n)
+    close = np.round(10000 * np.exp(np.cumsum(rng.normal(0, 0.01, n))))
+    open_ = np.round(close * (1 + rng.normal(0, 0.003, n)))
+    spread = np.abs(rng.normal(0, 0.006, n))
+    cols = {"open": open_, "high": np.round(np.maximum(open_, close) * (1 + spread)), "low": np.round(np.minimum(open_, close) * (1 - spread)),
+            "close": close, "volume": np.round(rng.lognormal(12, 1, n))}
+    dates = [f"{2000 + i // 100000:04d}-{i // 10000 % 10 + 1:02d}-{i % 28 + 1:02d} {i // 60 % 24:02d}:{i % 60:02d}:00" for i in range(n)]
+    return dates, cols
+
+
+def timed(fn, repeat: int):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter(); result = fn(); best = min(best, time.perf_counter() - started)
+    return result, best * 1000
+
+
+def row(name: str, body: bytes, ms: float):
+    print(f"  {name:<38}{len(body):>12,} B {ms:10.2f} ms")
+
+
+def main():
+    print(f"JSON 인코더: {'orjson' if orjson else 'json'}, brotli: {'사용' if brotli else '미설치'}")
+    for n in SIZES:
+        dates, cols = make_bars(n)
+        repeat = 5 if n <= 10_000 else 2
+        print(f"{n:,}봉")
+        # 기존 방식: 봉마다 dict를 만들고 FastAPI 기본 경로(jsonable_encoder + json.dumps)로 직렬화
+        body, ms = timed(lambda: JSONResponse(jsonable_encoder(records_payload(dates, cols))).body, repeat)
+        row("before: records + json", body, ms)
+        body, ms = timed(lambda: encode_json(columnar_payload(dates, cols)), repeat)
+        row("after: columnar + orjson", body, ms)
+        for encoding in ("gzip", "br") if brotli else ("gzip",):
+            body, ms = timed(lambda: compress(encode_json(columnar_payload(dates, cols)), encoding), repeat)
+            row(f"after: columnar + orjson + {encoding}", body[0], ms)
+        for mode in ("ohlc", "lttb"):
+            body, ms = timed(lambda: compress(encode_json(columnar_payload(*downsample(dates, cols, MAX_POINTS, mode))), "gzip"), repeat)
+            row(f"after: max_points={MAX_POINTS} {mode} + gzip", body[0], ms)
+
+    # 구간 병합은 전체 최고가/최저가를 그대로 남깁니다.
+    dates, cols = make_bars(SIZES[-1])
+    _, merged = downsample(dates, cols, MAX_POINTS, "ohlc")
+    assert merged["high"].max() == cols["high"].max() and merged["low"].min() == cols["low"].min()
+    assert merged["volume"].sum() == cols["volume"].sum()
+    print("검증: ohlc 다운샘플링 후에도 최고가/최저가/거래량 합계 유지")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from historical_store import HistoricalStore
+
+# 20년치 일봉 CSV 하나로 /historical-candles 처리량(요청/초)을 비교합니다.
+# 실행: python benchmarks/bench_historical_store.py [반복 횟수]
+
+REPEAT = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+CODE = "069500"
+
+
+def write_history(path: str, years: int = 20):
+    rng = np.random.default_rng(7)
+    dates = pd.bdate_range(end="2025-09-30", periods=years * 250)
+    close = 10000 * np.exp(np.cumsum(rng.normal(0, 0.01, len(dates))))
+    spread = close * rng.uniform(0, 0.02, len(dates))
+    df = pd.DataFrame({"Date": dates.strftime("%Y-%m-%d"), "Open": close.round(), "High": (close + spread).round(),
+                       "Low": (close - spread).round(), "Close": close.round()})
+    df.to_csv(path, index=False)
+    return len(df)
+
+
+def legacy_handler(file_path: str):
+    # 기존 엔드포인트 본문: 요청마다 CSV를 다시 읽고 행마다 pd.to_datetime 호출
+    df = pd.read_csv(file_path, names=['date', 'open', 'high', 'low', 'close'], header=0)
+    df.dropna(inplace=True)
+    for col in ['open', 'high', 'low', 'close']: df[col] = pd.to_numeric(df[col], errors='coerce')
+    df.dropna(inplace=True)
+    chart_data = df.to_dict('records')
+    for item in chart_data: item['date'] = pd.to_datetime(item['date']).strftime("%Y-%m-%d")
+    return chart_data
+
+
+async def store_handler(store: HistoricalStore, start: int, end: int, selected=("open", "high", "low", "close")):
+    # 새 엔드포인트 본문과 같은 변환
+    labels, values = await store.query(CODE, start, end, selected)
+    column_values = [values[col].tolist() for col in selected]
+    return [{"date": date, **dict(zip(selected, row))} for date, *row in zip(labels, *column_values)]
+
+
+def report(name: str, elapsed: float, count: int, rows: int):
+    print(f"{name:<36}{count / elapsed:>10,.1f} req/s  {elapsed / count * 1000:8.2f} ms/req  ({rows:,}행)")
+
+
+async def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        history_dir = os.path.join(tmp, "history"); os.makedirs(history_dir)
+        csv_path = os.path.join(history_dir, f"{CODE}.csv")
+        rows = write_history(csv_path)
+        print(f"20년 일봉 CSV {rows:,}행 ({os.path.getsize(csv_path) / 1024:.0f}KB), 반복 {REPEAT}회")
+
+        legacy_count = max(1, REPEAT // 10)
+        started = time.perf_counter()
+        for _ in range(legacy_count): result = legacy_handler(csv_path)
+        report("before: pandas 재파싱 (전체)", time.perf_counter() - started, legacy_count, len(result))
+
+        store = HistoricalStore(history_dir, os.path.join(history_dir, ".cache"))
+        started = time.perf_counter(); await store.load(CODE)
+        print(f"{'컬럼 캐시 생성 (최초 1회)':<36}{(time.perf_counter() - started) * 1000:>10,.1f} ms")
+        # 프로세스 재시작 후에는 .npy 캐시를 memmap으로 여는 비용만 듭니다.
+        restarted = HistoricalStore(history_dir, os.path.join(history_dir, ".cache"))
+        started = time.perf_counter(); await restarted.load(CODE)
+        print(f"{'재시작 후 캐시 로드':<36}{(time.perf_counter() - started) * 1000:>10,.1f} ms")
+
+        cases = [("after: 전체 구간", 0, 99991231, ("open", "high", "low", "close")),
+                 ("after: 최근 1년", 20241001, 20250930, ("open", "high", "low", "close")),
+                 ("after: 최근 1년, close만", 20241001, 20250930, ("close",))]
+        for name, start, end, selected in cases:
+            count = REPEAT * 50
+            started = time.perf_counter()
+            for _ in range(count): result = await store_handler(store, start, end, selected)
+            report(name, time.perf_counter() - started, count, len(result))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
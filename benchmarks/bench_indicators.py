@@ -0,0 +1,106 @@
+import math
+import os
+import sys
+import time
+from collections import deque
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from indicators import IndicatorEngine
+
+# 여러 종목의 5년치 일봉으로 보조지표 계산 비용을 비교합니다.
+# 실행: python benchmarks/bench_indicators.py [종목 수]
+
+SYMBOLS = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+BARS = 5 * 250
+SPECS = ["sma:20", "sma:60", "ema:20", "rsi:14", "macd:12:26:9", "bb:20:2"]
+
+
+# --- 기존 방식: 요청마다 봉을 하나씩 도는 순수 Python 계산 (CSVStockChart의 calcSMA와 같은 방식) ---
+def py_sma(close, n):
+    out, q, total = [], deque(), 0.0
+    for x in close:
+        q.append(x); total += x
+        if len(q) > n: total -= q.popleft()
+        out.append(total / n if len(q) == n else None)
+    return out
+
+
+def py_ema(close, n, alpha=None):
+    alpha = alpha or 2 / (n + 1); out, prev = [], None
+    for i, x in enumerate(close):
+        if i + 1 < n: out.append(None); continue
+        prev = sum(close[:n]) / n if i + 1 == n else prev + alpha * (x - prev)
+        out.append(prev)
+    return out
+
+
+def py_rsi(close, n):
+    gains = [max(b - a, 0.0) for a, b in zip(close, close[1:])]; losses = [max(a - b, 0.0) for a, b in zip(close, close[1:])]
+    ag, al = py_ema(gains, n, 1 / n), py_ema(losses, n, 1 / n)
+    return [None] + [None if g is None else (100.0 if l == 0 else 100 - 100 / (1 + g / l)) for g, l in zip(ag, al)]
+
+
+def py_macd(close, fast, slow, signal):
+    macd = [None if f is None or s is None else f - s for f, s in zip(py_ema(close, fast), py_ema(close, slow))]
+    valid = [m for m in macd if m is not None]
+    sig = [None] * (len(macd) - len(valid)) + py_ema(valid, signal)
+    return macd, sig
+
+
+def py_bb(close, n, k):
+    out = []
+    for i in range(len(close)):
+        if i + 1 < n: out.append(None); continue
+        window = close[i + 1 - n:i + 1]; mean = sum(window) / n
+        std = math.sqrt(sum((x - mean) ** 2 for x in window) / n)
+        out.append((mean + k * std, mean, mean - k * std))
+    return out
+
+
+def legacy_request(close):
+    return [py_sma(close, 20), py_sma(close, 60), py_ema(close, 20), py_rsi(close, 14), py_macd(close, 12, 26, 9), py_bb(close, 20, 2)]
+
+
+def timed(name: str, fn, count: int):
+    started = time.perf_counter(); fn(); elapsed = time.perf_counter() - started
+    print(f"{name:<34}{elapsed * 1000:9.1f} ms  {elapsed / count * 1000:8.3f} ms/종목  {count / elapsed:>10,.0f} 종목-요청/s")
+
+
+def main():
+    rng = np.random.default_rng(7)
+    series = {f"{code:06d}": 10000 * np.exp(np.cumsum(rng.normal(0, 0.015, BARS))) for code in range(SYMBOLS)}
+    labels = list(range(20200101, 20200101 + BARS))  # 오름차순 날짜 대용
+    print(f"{SYMBOLS}종목 x {BARS:,}봉, 지표 {', '.join(SPECS)}")
+
+    legacy_count = min(SYMBOLS, 20)
+    timed("before: 순수 Python 재계산", lambda: [legacy_request(close.tolist()) for close in list(series.values())[:legacy_count]], legacy_count)
+
+    engine = IndicatorEngine(max_entries=SYMBOLS * 2)
+    timed("after: 벡터 연산 (cold)", lambda: [engine.series(("day", code, "D"), spec, labels, close) for code, close in series.items() for spec in SPECS], SYMBOLS)
+    timed("after: 메모 적중", lambda: [engine.series(("day", code, "D"), spec, labels, close) for code, close in series.items() for spec in SPECS], SYMBOLS)
+
+    # 새 봉 1개가 확정된 뒤의 요청: 마지막 상태에서 이어서 계산
+    next_labels = labels + [labels[-1] + 1]
+    grown = {code: np.append(close, close[-1] * 1.01) for code, close in series.items()}
+    timed("after: 새 봉 1개 이어서 계산", lambda: [engine.series(("day", code, "D"), spec, next_labels, close) for code, close in grown.items() for spec in SPECS], SYMBOLS)
+
+    # 진행 중인 봉(틱마다 바뀌는 종가)의 지표 값
+    cached = [engine.series(("day", code, "D"), spec, next_labels, close) for code, close in grown.items() for spec in SPECS]
+    ticks = 100
+    timed(f"after: 진행 중인 봉 x{ticks}틱", lambda: [s.live(10000.0 + i) for i in range(ticks) for s in cached], SYMBOLS * ticks)
+
+    # 이어서 계산한 값이 전체 재계산과 같은지 확인
+    fresh = IndicatorEngine()
+    for code, close in list(grown.items())[:5]:
+        for spec in SPECS:
+            a, b = engine.series(("day", code, "D"), spec, next_labels, close).values, fresh.series(("day", code, "D"), spec, next_labels, close).values
+            for out in a:
+                x = np.array(a[out], dtype=float); y = np.array(b[out], dtype=float)
+                assert np.allclose(x, y, equal_nan=True, rtol=1e-9), (code, spec, out)
+    print(f"검증: 증분 계산 결과 = 전체 재계산 결과, {engine.snapshot_stats()}")
+
+
+if __name__ == "__main__":
+    main()
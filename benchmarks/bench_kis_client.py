@@ -0,0 +1,62 @@
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from kis_client import KISClient
+from fake_kis_server import FakeKISServer
+
+# 동시 요청 상황에서 기존 방식(async 핸들러 안의 requests.get)과
+# 공유 KISClient(커넥션 풀 + 비동기)의 p50/p99 지연 시간을 비교합니다.
+# 실행: python benchmarks/bench_kis_client.py [요청 수] [동시성]
+
+TOTAL_REQUESTS = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+CONCURRENCY = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+PATH = "/uapi/domestic-stock/v1/quotations/inquire-price"
+PARAMS = {"fid_cond_mrkt_div_code": "J", "fid_input_iscd": "005930"}
+
+
+def percentile(values, p):
+    values = sorted(values); return values[min(len(values) - 1, int(len(values) * p))]
+
+
+async def run_load(handler):
+    latencies = []; semaphore = asyncio.Semaphore(CONCURRENCY)
+    async def one():
+        async with semaphore:
+            # 요청 도착 시각부터 측정합니다. 이벤트 루프가 막혀 있으면 그 대기 시간도 지연에 포함됩니다.
+            started = time.perf_counter(); await asyncio.sleep(0)
+            await handler(); latencies.append(time.perf_counter() - started)
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(TOTAL_REQUESTS)))
+    return latencies, time.perf_counter() - started
+
+
+def report(name, latencies, elapsed):
+    print(f"{name:<28} p50={statistics.median(latencies) * 1000:8.1f}ms  p99={percentile(latencies, 0.99) * 1000:8.1f}ms  "
+          f"total={elapsed:6.2f}s  throughput={len(latencies) / elapsed:7.1f} req/s")
+
+
+async def main():
+    server = FakeKISServer(latency=0.05).start()
+    print(f"로컬 KIS 대역 서버: {server.base_url} (응답 지연 50ms), 요청 {TOTAL_REQUESTS}건, 동시성 {CONCURRENCY}")
+
+    async def before():
+        # 기존 코드 경로: async 핸들러 안에서 blocking requests.get 호출
+        res = requests.get(f"{server.base_url}{PATH}", headers={"tr_id": "FHKST01010100"}, params=PARAMS, timeout=5); res.raise_for_status(); res.json()
+    report("before (requests.get)", *await run_load(before))
+
+    async def token(): return "fake-token"
+    kis = KISClient(server.base_url, "app-key", "app-secret", token_provider=token, max_concurrency=CONCURRENCY, rate_limit_per_sec=0)
+    async def after(): await kis.get(PATH, "FHKST01010100", PARAMS)
+    report("after (KISClient, pooled)", *await run_load(after))
+    await kis.close()
+    server.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,88 @@
+import asyncio
+import csv
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from snapshot_store import SnapshotRecorder
+
+# 여러 종목의 틱을 초당 RATE건씩 기록하면서 이벤트 루프 지연(1ms 타이머가 늦게 깨어난 정도)을 측정합니다.
+# 실행: python benchmarks/bench_snapshot_store.py [초당 건수] [측정 시간(초)]
+
+RATE = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+DURATION = float(sys.argv[2]) if len(sys.argv) > 2 else 5
+SYMBOLS = [f"{code:06d}" for code in range(5930, 5930 + 200)]
+TICK_BATCH = 100  # 업스트림 메시지가 몰려 들어오는 단위
+
+
+def legacy_save(root: str, data: dict):
+    # 기존 save_snapshot_to_csv: 행마다 파일을 열고 닫는 동기 쓰기
+    file_path = os.path.join(root, 'price_snapshots.csv'); is_new_file = not os.path.exists(file_path)
+    with open(file_path, 'a', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        if is_new_file: writer.writerow(['timestamp', 'price', 'change', 'change_rate', 'date'])
+        writer.writerow([datetime.now().isoformat(), data.get("stck_prpr"), data.get("prdy_vrss"), data.get("prdy_ctrt"), data.get("stck_bsop_date")])
+
+
+async def measure_lag(stop: asyncio.Event, lags: list):
+    while not stop.is_set():
+        started = time.perf_counter(); await asyncio.sleep(0.001)
+        lags.append((time.perf_counter() - started - 0.001) * 1000)
+
+
+async def produce(record, stop: asyncio.Event) -> int:
+    # RATE건/초가 되도록 TICK_BATCH건씩 몰아서 넣습니다.
+    count, started = 0, time.perf_counter()
+    while not stop.is_set():
+        for i in range(TICK_BATCH):
+            record(SYMBOLS[(count + i) % len(SYMBOLS)], count + i)
+        count += TICK_BATCH
+        delay = started + count / RATE - time.perf_counter()
+        await asyncio.sleep(max(delay, 0))
+    return count
+
+
+async def run_case(name: str, record, after=None):
+    stop = asyncio.Event(); lags = []
+    lag_task = asyncio.create_task(measure_lag(stop, lags))
+    producer = asyncio.create_task(produce(record, stop))
+    started = time.perf_counter()
+    await asyncio.sleep(DURATION); stop.set()
+    produced = await producer; await lag_task
+    if after is not None: await after()
+    elapsed = time.perf_counter() - started
+    lags.sort()
+    print(f"{name:<28}{produced / elapsed:>10,.0f} rows/s  loop lag p50 {statistics.median(lags):6.2f}ms  "
+          f"p99 {lags[int(len(lags) * 0.99)]:6.2f}ms  max {lags[-1]:7.2f}ms")
+
+
+async def main():
+    print(f"목표 {RATE:,} rows/s, {len(SYMBOLS)}종목, {DURATION:.0f}초")
+    with tempfile.TemporaryDirectory() as tmp:
+        await run_case("baseline: 기록 없음", lambda code, seq: None)
+        await run_case("before: 행마다 동기 append",
+                       lambda code, seq: legacy_save(tmp, {"stck_prpr": 10000 + seq % 100, "prdy_vrss": 50, "prdy_ctrt": 0.5, "stck_bsop_date": "20250930"}))
+
+        for policy in ("never", "interval", "batch"):
+            recorder = SnapshotRecorder(os.path.join(tmp, policy), fsync=policy)
+            recorder.start()
+            await run_case(f"after: write-behind ({policy})",
+                           lambda code, seq: recorder.record(code, "tick", "090000", 10000 + seq % 100, 50, 0.5, 10, seq),
+                           recorder.stop)
+            stats = recorder.snapshot_stats()
+            print(f"    written {stats['written']:,}  batches {stats['batches']}  fsyncs {stats['fsyncs']}  dropped {stats['dropped']}")
+
+        # 조회: 한 종목 하루치를 청크로 읽어 내려보내는 속도
+        today = int(datetime.now().strftime("%Y%m%d"))
+        started = time.perf_counter()
+        size = sum(len(chunk) for chunk in recorder.iter_csv(SYMBOLS[0], today - 1, today + 1))
+        elapsed = time.perf_counter() - started
+        print(f"조회 스트리밍: {SYMBOLS[0]} {size / 1024:,.0f}KB, {elapsed * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
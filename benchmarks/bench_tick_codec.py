@@ -0,0 +1,49 @@
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tick_codec import TickEncoder, parse_ticks
+from fake_kis_server import make_stock_tick
+
+# H0STCNT0 체결 메시지의 파싱/직렬화 속도와 틱당 전송 바이트를 비교합니다.
+# 실행: python benchmarks/bench_tick_codec.py [메시지 수]
+
+FRAMES = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+SYMBOLS = [f"{code:06d}" for code in range(5930, 5930 + 20)]
+
+
+def timed(fn, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter(); result = fn(); best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def main():
+    random.seed(7)
+    frames = [make_stock_tick(random.choice(SYMBOLS), seq) for seq in range(FRAMES)]
+    print(f"H0STCNT0 메시지 {FRAMES:,}건 (평균 {sum(map(len, frames)) / FRAMES:.0f}바이트)")
+
+    elapsed, ticks = timed(lambda: [tick for frame in frames for tick in parse_ticks(frame)])
+    print(f"parse_ticks                     {FRAMES / elapsed:>12,.0f} frames/s")
+
+    # 기존 방식: 클라이언트마다 원본 문자열을 JSON으로 감싸서 전송
+    elapsed, payloads = timed(lambda: [json.dumps({"type": "tick", "data": frame}) for frame in frames])
+    print(f"{'before: json raw wrap':<32}{FRAMES / elapsed:>12,.0f} ticks/s  {sum(map(len, payloads)) / FRAMES:7.1f} bytes/tick")
+
+    cases = [("raw (호환)", "raw", None), ("msgpack 전체 필드", "msgpack", None), ("msgpack price/volume/time", "msgpack", ["time", "price", "volume"]),
+             ("delta 전체 필드", "delta", None), ("delta price/volume/time", "delta", ["time", "price", "volume"])]
+    for name, fmt, fields in cases:
+        def encode_all():
+            for tick in ticks: tick.encoded = None  # 틱 단위 인코딩 캐시를 비워 매번 새로 직렬화합니다.
+            encoder = TickEncoder(fmt, fields)
+            return [encoder.encode(tick) for tick in ticks]
+        elapsed, payloads = timed(encode_all)
+        print(f"{'after: ' + name:<32}{FRAMES / elapsed:>12,.0f} ticks/s  {sum(map(len, payloads)) / FRAMES:7.1f} bytes/tick")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from connection_manager import ConnectionManager
+from tick_hub import TickHub, STOCK_TICK_TR_ID, INDEX_TICK_TR_ID
+from fake_kis_server import FakeKISWebSocketServer
+
+# 로컬 KIS 웹소켓 대역 서버와 가상 클라이언트 1,000개로 허브를 부하 테스트합니다.
+# 기존 구조에서는 클라이언트마다 업스트림 연결과 Approval Key가 하나씩 필요했습니다.
+# 실행: python benchmarks/bench_tick_hub.py [클라이언트 수] [측정 시간(초)]
+
+CLIENTS = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+DURATION = float(sys.argv[2]) if len(sys.argv) > 2 else 5.0
+SYMBOLS = [f"{code:06d}" for code in range(5930, 5930 + 20)]
+INDICES = ["0001", "1001", "2001"]
+
+
+class SimulatedClient:
+    """FastAPI WebSocket 대신 수신 메시지 수와 지연만 기록하는 가상 클라이언트."""
+    def __init__(self, latencies: list):
+        self.received = 0
+        self.latencies = latencies
+    async def accept(self): pass
+    async def send_text(self, message: str):
+        self.received += 1
+        # 대역 서버가 마지막 필드에 넣은 송신 시각으로 서버→클라이언트 지연을 계산합니다.
+        if self.received % 10 == 0: self.latencies.append(time.time() - float(message.rsplit("^", 1)[1].rstrip('"}')))
+
+
+def percentile(values, p):
+    values = sorted(values); return values[min(len(values) - 1, int(len(values) * p))]
+
+
+async def main():
+    server = FakeKISWebSocketServer(tick_interval=0.1, drop_after=DURATION + 1).start()
+    approval_keys = 0
+    async def approval_key():
+        nonlocal approval_keys; approval_keys += 1; return "fake-approval-key"
+    async def on_message(tr_id, tr_key, msg): manager.publish((tr_id, tr_key), msg)
+    hub = TickHub(server.ws_url, approval_key, on_message, reconnect_delay=0.5)
+    manager = ConnectionManager(hub)
+
+    latencies = []; clients = [SimulatedClient(latencies) for _ in range(CLIENTS)]
+    started = time.perf_counter()
+    for client in clients:
+        keys = [(STOCK_TICK_TR_ID, code) for code in random.sample(SYMBOLS, 3)] + [(INDEX_TICK_TR_ID, random.choice(INDICES))]
+        await manager.connect(client, keys)
+    print(f"클라이언트 {CLIENTS}개 연결/구독: {time.perf_counter() - started:.2f}s")
+
+    await asyncio.sleep(DURATION)
+    delivered = sum(client.received for client in clients)
+    print(f"업스트림 연결 {server.connections.value}개, Approval Key 발급 {approval_keys}회, 업스트림 구독 요청 {server.subscribe_requests.value}건 (활성 {server.active_subscriptions.value}건)")
+    print(f"업스트림 수신 {hub.stats['messages']}건 → 클라이언트 전달 {delivered}건 ({delivered / DURATION:,.0f} msg/s)")
+    print(f"서버→클라이언트 지연 p50={statistics.median(latencies) * 1000:.1f}ms  p99={percentile(latencies, 0.99) * 1000:.1f}ms")
+
+    # 업스트림 연결이 끊긴 뒤 자동 재연결/재구독 확인
+    await asyncio.sleep(2.5)
+    print(f"재연결 후: 업스트림 연결 누계 {server.connections.value}개, 활성 구독 {server.active_subscriptions.value}건, 허브 {hub.snapshot_stats()}")
+
+    for client in clients: await manager.disconnect(client)
+    await asyncio.sleep(0.3)
+    print(f"전체 해제 후: 허브 구독 {len(hub.refcounts)}건, 업스트림 활성 구독 {server.active_subscriptions.value}건, 해지 요청 {server.unsubscribe_requests.value}건")
+    await hub.stop(); server.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
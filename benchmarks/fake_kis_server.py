@@ -0,0 +1,156 @@
+import asyncio
+import json
+import multiprocessing
+import time
+
+# --- 벤치마크용 로컬 KIS REST 대역 서버 ---
+# 별도 프로세스에서 동작하므로, 호출 측이 이벤트 루프를 막아도 응답하며 GIL 경합도 측정에 섞이지 않습니다.
+
+PRICE_OUTPUT = {"rprs_mrkt_kor_name": "KOSPI200", "bstp_kor_isnm": "전기.전자", "stck_prpr": "71900", "prdy_vrss": "-100", "prdy_ctrt": "-0.14",
+                "stck_oprc": "72100", "stck_hgpr": "72400", "stck_lwpr": "71700", "w52_hgpr": "77000", "w52_lwpr": "55000", "acml_vol": "3052507",
+                "acml_tr_pbmn": "219853241700", "mket_prtt_val": "4290000", "frgn_hldn_qty_rate": "51.2", "per": "14.2", "pbr": "1.4", "dvrg_rto": "2.0",
+                "stck_bsop_date": "20250902"}
+INDEX_OUTPUT = {"bstp_nmix_prpr": "2580.12", "prdy_vrss": "12.3", "prdy_ctrt": "0.48", "prdy_vrss_sign": "2"}
+
+
+class FakeKISServer:
+    def __init__(self, latency: float = 0.05, host: str = "127.0.0.1", port: int = 0):
+        self.latency = latency
+        self.host = host
+        self.port = port
+        self.counter = multiprocessing.Value("i", 0)
+        self.process = None
+
+    @property
+    def request_count(self): return self.counter.value
+
+    @property
+    def base_url(self): return f"http://{self.host}:{self.port}"
+
+    def response_for(self, path: str) -> dict:
+        if "oauth2/tokenP" in path: return {"access_token": "fake-token", "expires_in": 86400, "access_token_token_expired": "2099-12-31 23:59:59"}
+        if "oauth2/Approval" in path: return {"approval_key": "fake-approval-key"}
+        if "inquire-index-price" in path: return {"rt_cd": "0", "output": INDEX_OUTPUT}
+        return {"rt_cd": "0", "output": PRICE_OUTPUT}
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                lines = head.decode("latin-1").split("\r\n")
+                path = lines[0].split(" ")[1]
+                length = 0
+                for line in lines[1:]:
+                    if line.lower().startswith("content-length:"): length = int(line.split(":", 1)[1])
+                if length: await reader.readexactly(length)
+                with self.counter.get_lock(): self.counter.value += 1
+                await asyncio.sleep(self.latency)
+                body = json.dumps(self.response_for(path)).encode()
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nConnection: keep-alive\r\nContent-Length: " + str(len(body)).encode() + b"\r\n\r\n" + body)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError): pass
+        finally: writer.close()
+
+    def _run(self, port_pipe):
+        loop = asyncio.new_event_loop()
+        server = loop.run_until_complete(asyncio.start_server(self.handle, self.host, self.port, backlog=1024))
+        port_pipe.send(server.sockets[0].getsockname()[1])
+        loop.run_forever()
+
+    def start(self):
+        parent_end, child_end = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=self._run, args=(child_end,), daemon=True); self.process.start()
+        self.port = parent_end.recv(); return self
+
+    def stop(self):
+        self.process.terminate(); self.process.join(timeout=5)
+
+
+# --- 벤치마크용 로컬 KIS 실시간(WebSocket) 대역 서버 ---
+
+def make_stock_tick(code: str, seq: int, sent_at: float = 0.0) -> str:
+    """H0STCNT0 체결 메시지 1건 (46개 필드). 마지막 필드에는 지연 측정용 송신 시각을 넣습니다."""
+    price = 70000 + (seq * 37) % 2000
+    hhmmss = f"{9 + seq // 3600 % 6:02d}{seq // 60 % 60:02d}{seq % 60:02d}"
+    fields = [code, hhmmss, str(price), "2" if price >= 71000 else "5", str(price - 71000), f"{(price - 71000) / 710:.2f}", "71023.83", "71100", "72400", "69900",
+              str(price + 100), str(price), str(1 + seq % 50), str(3052507 + seq), str(219853241700 + seq * price), "5105", "6937", "1832", "84.90", "1366314", "1159996",
+              "1", "0.39", "20.29", "090020", "5", "-200", "090820", "5", "-500", "092619", "2", "200", "20250902", "20", "N", "65945", "216924", "1118750", "2098666",
+              "0.02", "2819892", "108.22", "0", "", f"{sent_at:.6f}" if sent_at else "0"]
+    return "0|H0STCNT0|001|" + "^".join(fields)
+
+
+def make_index_tick(code: str, seq: int, sent_at: float = 0.0) -> str:
+    """H0UPANC0 업종지수 메시지 1건. 마지막 필드에는 지연 측정용 송신 시각을 넣습니다."""
+    value = 2580 + (seq % 200) / 10
+    hhmmss = f"{9 + seq // 3600 % 6:02d}{seq // 60 % 60:02d}{seq % 60:02d}"
+    fields = [code, hhmmss, f"{value:.2f}", "2", f"{value - 2570:.2f}", str(301234567 + seq), str(9876543210 + seq), "1200", "3400000", "0.39",
+              "2575.10", "2591.30", "2570.55", "0.19", "2", "0.81", "2", "-0.01", "5", "512", "18", "301", "12", "8", "2", f"{sent_at:.6f}" if sent_at else "0"]
+    return "0|H0UPANC0|001|" + "^".join(fields)
+
+
+class FakeKISWebSocketServer:
+    def __init__(self, tick_interval: float = 0.1, drop_after: float | None = None, host: str = "127.0.0.1", port: int = 0):
+        # tick_interval: 구독된 코드마다 체결 메시지를 보내는 주기(초)
+        # drop_after: 지정한 시간이 지나면 모든 연결을 한 번 끊어 재연결/재구독을 검증합니다.
+        self.tick_interval = tick_interval
+        self.drop_after = drop_after
+        self.host = host
+        self.port = port
+        self.connections = multiprocessing.Value("i", 0)
+        self.subscribe_requests = multiprocessing.Value("i", 0)
+        self.unsubscribe_requests = multiprocessing.Value("i", 0)
+        self.active_subscriptions = multiprocessing.Value("i", 0)
+        self.process = None
+
+    @property
+    def ws_url(self): return f"ws://{self.host}:{self.port}"
+
+    async def handle(self, ws):
+        with self.connections.get_lock(): self.connections.value += 1
+        subscriptions: set[tuple[str, str]] = set()
+        async def pump():
+            seq = 0
+            while True:
+                await asyncio.sleep(self.tick_interval); seq += 1
+                for tr_id, tr_key in list(subscriptions):
+                    make = make_stock_tick if tr_id == "H0STCNT0" else make_index_tick
+                    await ws.send(make(tr_key, seq, time.time()))
+        pump_task = asyncio.create_task(pump())
+        try:
+            async for raw in ws:
+                request = json.loads(raw)
+                key = (request["body"]["input"]["tr_id"], request["body"]["input"]["tr_key"])
+                if request["header"]["tr_type"] == "1":
+                    with self.subscribe_requests.get_lock(): self.subscribe_requests.value += 1
+                    if key not in subscriptions:
+                        subscriptions.add(key)
+                        with self.active_subscriptions.get_lock(): self.active_subscriptions.value += 1
+                else:
+                    with self.unsubscribe_requests.get_lock(): self.unsubscribe_requests.value += 1
+                    if key in subscriptions:
+                        subscriptions.discard(key)
+                        with self.active_subscriptions.get_lock(): self.active_subscriptions.value -= 1
+                await ws.send(json.dumps({"header": {"tr_id": key[0], "tr_key": key[1]}, "body": {"rt_cd": "0", "msg1": "SUBSCRIBE SUCCESS"}}))
+        except Exception: pass
+        finally:
+            pump_task.cancel()
+            with self.active_subscriptions.get_lock(): self.active_subscriptions.value -= len(subscriptions)
+
+    def _run(self, port_pipe):
+        import websockets
+        async def main():
+            async with websockets.serve(self.handle, self.host, self.port, max_queue=None) as server:
+                port_pipe.send(list(server.sockets)[0].getsockname()[1])
+                if self.drop_after is not None:
+                    await asyncio.sleep(self.drop_after)
+                    for conn in list(server.connections): await conn.close()
+                await asyncio.Future()
+        asyncio.run(main())
+
+    def start(self):
+        parent_end, child_end = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=self._run, args=(child_end,), daemon=True); self.process.start()
+        self.port = parent_end.recv(); return self
+
+    def stop(self):
+        self.process.terminate(); self.process.join(timeout=5)
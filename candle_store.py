@@ -0,0 +1,115 @@
+import asyncio
+import os
+
+import numpy as np
+
+# --- 종목별 일봉 로컬 저장소 ---
+# data/candles/{종목코드}/ 아래에 컬럼별 바이너리 파일(date.i4, open.f8 ...)로 저장합니다.
+# 새 봉은 파일 끝에 덧붙이기만 하므로, 최초 적재 이후에는 마지막 저장일 이후 데이터만 받아오면 됩니다.
+
+CANDLE_STORE_DIR = os.getenv("CANDLE_STORE_DIR", "data/candles")
+# 날짜는 YYYYMMDD 정수, 가격과 거래량은 float64로 저장합니다.
+CANDLE_COLUMNS = {"date": np.dtype("<i4"), "open": np.dtype("<f8"), "high": np.dtype("<f8"), "low": np.dtype("<f8"), "close": np.dtype("<f8"), "volume": np.dtype("<f8")}
+
+
+def empty_series() -> dict:
+    return {col: np.empty(0, dtype=dtype) for col, dtype in CANDLE_COLUMNS.items()}
+
+
+def to_date_int(value: str | None, default: int) -> int:
+    # "2025-09-02", "20250902" 형식 모두 허용합니다.
+    if not value: return default
+    digits = value.replace("-", "")[:8]
+    if len(digits) != 8 or not digits.isdigit(): raise ValueError(f"잘못된 날짜 형식: {value}")
+    return int(digits)
+
+
+class CandleStore:
+    def __init__(self, root_dir: str = CANDLE_STORE_DIR):
+        self.root_dir = root_dir
+        self.series: dict[str, dict] = {}
+        self.locks: dict[str, asyncio.Lock] = {}
+
+    def lock_for(self, stock_code: str) -> asyncio.Lock:
+        # 같은 종목의 동기화가 동시에 여러 번 실행되지 않도록 종목별 락을 사용합니다.
+        return self.locks.setdefault(stock_code, asyncio.Lock())
+
+    def _path(self, stock_code: str, col: str) -> str:
+        return os.path.join(self.root_dir, stock_code, f"{col}.{CANDLE_COLUMNS[col].kind}{CANDLE_COLUMNS[col].itemsize}")
+
+    def _load_from_disk(self, stock_code: str) -> dict:
+        series = empty_series()
+        if not os.path.exists(self._path(stock_code, "date")): return series
+        for col, dtype in CANDLE_COLUMNS.items():
+            series[col] = np.fromfile(self._path(stock_code, col), dtype=dtype)
+        # 쓰기 도중 중단되어 컬럼 길이가 어긋난 경우 가장 짧은 길이에 맞춥니다.
+        length = min(len(arr) for arr in series.values())
+        return {col: arr[:length] for col, arr in series.items()}
+
+    async def load(self, stock_code: str) -> dict:
+        series = self.series.get(stock_code)
+        if series is None:
+            series = await asyncio.to_thread(self._load_from_disk, stock_code)
+            self.series[stock_code] = series
+        return series
+
+    def last_date(self, stock_code: str) -> int | None:
+        series = self.series.get(stock_code)
+        if series is None or len(series["date"]) == 0: return None
+        return int(series["date"][-1])
+
+    def _write(self, stock_code: str, new_rows: dict, keep: int):
+        os.makedirs(os.path.join(self.root_dir, stock_code), exist_ok=True)
+        for col, dtype in CANDLE_COLUMNS.items():
+            path = self._path(stock_code, col)
+            if os.path.exists(path) and os.path.getsize(path) != keep * dtype.itemsize:
+                # 덮어써야 하는 마지막 봉(장중 미완성 봉)만 잘라냅니다.
+                os.truncate(path, keep * dtype.itemsize)
+            with open(path, "ab") as f: new_rows[col].astype(dtype, copy=False).tofile(f)
+
+    async def append(self, stock_code: str, rows: dict) -> int:
+        """날짜 오름차순 rows를 덧붙입니다. 마지막 저장일과 같은 날짜의 봉은 새 값으로 교체합니다."""
+        series = await self.load(stock_code)
+        if len(rows["date"]) == 0: return 0
+        order = np.argsort(rows["date"], kind="stable")
+        rows = {col: np.asarray(rows[col], dtype=dtype)[order] for col, dtype in CANDLE_COLUMNS.items()}
+        last = self.last_date(stock_code)
+        keep = len(series["date"])
+        if last is not None:
+            rows = {col: arr[rows["date"] >= last] for col, arr in rows.items()}
+            if len(rows["date"]) and rows["date"][0] == last: keep -= 1
+        if len(rows["date"]) == 0: return 0
+        await asyncio.to_thread(self._write, stock_code, rows, keep)
+        self.series[stock_code] = {col: np.concatenate([series[col][:keep], rows[col]]) for col in CANDLE_COLUMNS}
+        return len(rows["date"])
+
+    async def range(self, stock_code: str, start: int, end: int) -> dict:
+        # 날짜 컬럼이 정렬되어 있으므로 이진 탐색으로 구간을 잘라냅니다.
+        series = await self.load(stock_code)
+        lo = np.searchsorted(series["date"], start, side="left")
+        hi = np.searchsorted(series["date"], end, side="right")
+        return {col: arr[lo:hi] for col, arr in series.items()}
+
+
+def date_ints_to_days(dates: np.ndarray) -> np.ndarray:
+    # YYYYMMDD 정수 배열을 1970-01-01 기준 일수로 변환합니다.
+    months = (dates // 10000 - 1970) * 12 + (dates // 100 % 100 - 1)
+    return months.astype("datetime64[M]").astype("datetime64[D]").astype(np.int64) + dates % 100 - 1
+
+
+def aggregate_candles(series: dict, period: str) -> dict:
+    """일봉을 주봉("W") 또는 월봉("M")으로 묶습니다. 각 봉의 날짜는 구간의 마지막 거래일입니다."""
+    dates = series["date"]
+    if len(dates) == 0 or period == "D": return series
+    if period == "M":
+        keys = dates // 100
+    elif period == "W":
+        days = date_ints_to_days(dates)
+        # 1970-01-01은 목요일이므로 3을 더하면 월요일 시작 주 번호가 됩니다.
+        keys = (days + 3) // 7
+    else:
+        raise ValueError(f"지원하지 않는 집계 주기: {period}")
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    ends = np.r_[starts[1:], len(dates)] - 1
+    return {"date": dates[ends], "open": series["open"][starts], "high": np.maximum.reduceat(series["high"], starts),
+            "low": np.minimum.reduceat(series["low"], starts), "close": series["close"][ends], "volume": np.add.reduceat(series["volume"], starts)}
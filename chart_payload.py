@@ -0,0 +1,112 @@
+import gzip
+import json
+import os
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:  # orjson이 없으면 표준 json으로 직렬화합니다.
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # brotli가 없으면 gzip만 사용합니다.
+    brotli = None
+
+# --- 차트 응답 (열 형식 / 압축 / 다운샘플링) ---
+# 봉마다 객체를 만드는 대신 프론트엔드 AppChartData 형태의 병렬 배열로 보냅니다.
+#   {"categories": [날짜...], "candlestick": [[시가, 고가, 저가, 종가]...], "line": [종가...], "volumes": [거래량...]}
+# max_points를 주면 구간별 OHLC 병합(최고가/최저가 보존) 또는 LTTB로 점 개수를 줄입니다.
+
+CHART_FORMATS = ("records", "columnar")
+CHART_DOWNSAMPLE_MODES = ("ohlc", "lttb")
+CHART_COMPRESS_MIN_BYTES = int(os.getenv("CHART_COMPRESS_MIN_BYTES", "1024"))
+CHART_GZIP_LEVEL = int(os.getenv("CHART_GZIP_LEVEL", "1"))
+CHART_BROTLI_QUALITY = int(os.getenv("CHART_BROTLI_QUALITY", "4"))
+OHLCV_COLUMNS = ("open", "high", "low", "close", "volume")
+
+
+def _take(labels, indices: np.ndarray):
+    if isinstance(labels, np.ndarray): return labels[indices]
+    return [labels[i] for i in indices.tolist()]
+
+
+def downsample_ohlc(labels, cols: dict, max_points: int):
+    """봉을 max_points개 구간으로 나눠 병합합니다. 구간의 날짜는 마지막 봉 기준입니다(aggregate_candles와 같음)."""
+    n = len(cols["close"])
+    if n <= max_points: return labels, cols
+    starts = (np.arange(max_points) * n) // max_points
+    ends = np.append(starts[1:], n) - 1
+    merged = {"open": cols["open"][starts], "high": np.maximum.reduceat(cols["high"], starts), "low": np.minimum.reduceat(cols["low"], starts),
+              "close": cols["close"][ends], "volume": np.add.reduceat(cols["volume"], starts)}
+    return _take(labels, ends), merged
+
+
+def lttb_indices(values: np.ndarray, threshold: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets: 선 모양을 가장 잘 유지하는 threshold개 지점의 인덱스."""
+    n = len(values)
+    if threshold >= n or threshold < 3: return np.arange(n)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64); selected[0] = 0; selected[-1] = n - 1
+    anchor = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = (end + next_end - 1) / 2; avg_y = values[end:next_end].mean()
+        xs = np.arange(start, end)
+        area = np.abs((anchor - avg_x) * (values[start:end] - values[anchor]) - (anchor - xs) * (avg_y - values[anchor]))
+        anchor = start + int(area.argmax())
+        selected[i + 1] = anchor
+    return selected
+
+
+def downsample(labels, cols: dict, max_points: int | None, mode: str = "ohlc"):
+    if not max_points or len(cols["close"]) <= max_points: return labels, cols
+    if mode == "lttb":
+        # 종가 선 기준으로 대표 봉을 고릅니다(고른 봉의 OHLC는 그대로).
+        indices = lttb_indices(cols["close"], max_points)
+        return _take(labels, indices), {col: arr[indices] for col, arr in cols.items()}
+    return downsample_ohlc(labels, cols, max_points)
+
+
+def columnar_payload(categories: list, cols: dict) -> dict:
+    close = np.asarray(cols["close"], dtype=np.float64)
+    candlestick = np.column_stack([np.asarray(cols[col], dtype=np.float64) for col in ("open", "high", "low", "close")])
+    return {"categories": categories, "candlestick": candlestick, "line": close, "volumes": np.asarray(cols["volume"], dtype=np.float64)}
+
+
+def records_payload(dates: list, cols: dict, fields=OHLCV_COLUMNS) -> list[dict]:
+    keys = ("date", *fields)
+    return [dict(zip(keys, row)) for row in zip(dates, *(cols[field].tolist() for field in fields))]
+
+
+def records_to_columns(records: list[dict]) -> tuple[list, dict]:
+    return [record["date"] for record in records], {col: np.array([record[col] for record in records], dtype=np.float64) for col in OHLCV_COLUMNS}
+
+
+def encode_json(payload) -> bytes:
+    if orjson is not None: return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(payload, separators=(",", ":"), default=lambda value: value.tolist()).encode()
+
+
+def accepted_encodings(accept_encoding: str) -> set[str]:
+    encodings = set()
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"): continue
+        if name: encodings.add(name)
+    return encodings
+
+
+def compress(body: bytes, accept_encoding: str) -> tuple[bytes, str | None]:
+    """클라이언트가 받는 형식 중 br > gzip 순서로 압축합니다. 작은 응답은 그대로 보냅니다."""
+    if len(body) < CHART_COMPRESS_MIN_BYTES: return body, None
+    encodings = accepted_encodings(accept_encoding)
+    if brotli is not None and "br" in encodings: return brotli.compress(body, quality=CHART_BROTLI_QUALITY), "br"
+    if "gzip" in encodings: return gzip.compress(body, compresslevel=CHART_GZIP_LEVEL), "gzip"
+    return body, None
+
+
+def encode_columnar(categories: list, cols: dict, accept_encoding: str) -> tuple[bytes, str | None]:
+    return compress(encode_json(columnar_payload(categories, cols)), accept_encoding)
@@ -0,0 +1,166 @@
+import asyncio
+import os
+import time
+from collections import deque
+
+from fastapi import WebSocket
+
+from tick_hub import TickHub, HubCapacityError
+from tick_codec import Tick, TickEncoder
+
+# --- WebSocket 연결 관리자 ---
+# 클라이언트마다 제한된 크기의 송신 큐와 전송 전용 태스크를 둡니다.
+# broadcast/publish는 큐에 넣기만 하므로, 느린 클라이언트가 다른 클라이언트의 틱을 지연시키지 않습니다.
+
+MAX_CLIENT_SUBSCRIPTIONS = int(os.getenv("MAX_CLIENT_SUBSCRIPTIONS", "50"))
+CLIENT_QUEUE_SIZE = int(os.getenv("CLIENT_QUEUE_SIZE", "256"))
+CLIENT_SEND_TIMEOUT = float(os.getenv("CLIENT_SEND_TIMEOUT", "5"))
+# 큐가 가득 찬 상태가 이 시간 이상 이어지면 멈춘 클라이언트로 보고 연결을 끊습니다.
+CLIENT_STALL_TIMEOUT = float(os.getenv("CLIENT_STALL_TIMEOUT", "10"))
+
+
+class ClientChannel:
+    def __init__(self, manager: "ConnectionManager", websocket: WebSocket, max_queue: int):
+        self.manager = manager
+        self.websocket = websocket
+        self.max_queue = max_queue
+        # (conflation key, message). key가 None인 메시지(구독 응답 등)는 병합하지 않습니다.
+        # Tick은 전송 직전에 클라이언트가 요청한 형식으로 인코딩합니다.
+        self.queue: deque[tuple[tuple | None, str | Tick]] = deque()
+        self.encoder = TickEncoder()
+        self.ready = asyncio.Event()
+        self.full_since: float | None = None
+        self.sending_since: float | None = None
+        self.closed = False
+        self.sent = 0
+        self.conflated = 0
+        self.dropped = 0
+        self.writer = asyncio.create_task(self.write_loop())
+
+    def put(self, key: tuple | None, message: str | Tick):
+        if self.closed: return
+        if len(self.queue) >= self.max_queue:
+            # 밀린 클라이언트: 종목별로 가장 최근 틱만 남기고 이전 틱은 버립니다.
+            if self.full_since is None: self.full_since = time.monotonic()
+            self.conflate(key)
+            if len(self.queue) >= self.max_queue:
+                self.queue.popleft(); self.dropped += 1; self.manager.stats["dropped"] += 1
+        self.queue.append((key, message))
+        self.ready.set()
+
+    def conflate(self, incoming_key: tuple | None):
+        seen = {incoming_key} if incoming_key is not None else set()
+        kept: deque = deque()
+        for key, message in reversed(self.queue):
+            if key is not None and key in seen:
+                self.conflated += 1; self.manager.stats["conflated"] += 1; continue
+            if key is not None: seen.add(key)
+            kept.appendleft((key, message))
+        self.queue = kept
+
+    async def write_loop(self):
+        try:
+            while True:
+                await self.ready.wait()
+                while self.queue:
+                    _, message = self.queue.popleft()
+                    # 전송 시간 초과는 태스크를 추가로 만들지 않도록 관리자의 감시 루프에서 확인합니다.
+                    self.sending_since = time.monotonic()
+                    if isinstance(message, Tick): message = self.encoder.encode(message)
+                    if isinstance(message, bytes): await self.websocket.send_bytes(message)
+                    else: await self.websocket.send_text(message)
+                    self.sending_since = None; self.sent += 1
+                    if len(self.queue) < self.max_queue: self.full_since = None
+                self.ready.clear()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.manager.evict(self, f"send failed: {e}")
+
+    def close(self):
+        self.closed = True
+        self.queue.clear()
+        if self.writer is not asyncio.current_task(): self.writer.cancel()
+
+
+class ConnectionManager:
+    # 클라이언트별 구독 목록을 관리하고, 허브(TickHub)의 참조 카운트와 연동합니다.
+    def __init__(self, hub: TickHub, max_queue: int = CLIENT_QUEUE_SIZE):
+        self.hub = hub
+        self.max_queue = max_queue
+        self.active_connections: dict[WebSocket, set[tuple[str, str]]] = {}
+        self.channels: dict[WebSocket, ClientChannel] = {}
+        self.subscribers: dict[tuple[str, str], set[WebSocket]] = {}
+        self.stats = {"conflated": 0, "dropped": 0, "evicted": 0}
+        self.watchdog: asyncio.Task | None = None
+        # 이벤트 루프는 태스크를 약한 참조로만 들고 있으므로, 끝날 때까지 여기서 참조를 유지합니다.
+        self.tasks: set[asyncio.Task] = set()
+    async def watch_stalled_clients(self):
+        while True:
+            await asyncio.sleep(1)
+            now = time.monotonic()
+            for channel in list(self.channels.values()):
+                if channel.sending_since is not None and now - channel.sending_since > CLIENT_SEND_TIMEOUT: self.evict(channel, "send timeout")
+                elif channel.full_since is not None and now - channel.full_since > CLIENT_STALL_TIMEOUT: self.evict(channel, "stalled")
+    async def connect(self, websocket: WebSocket, subscriptions=()):
+        if self.watchdog is None: self.watchdog = asyncio.create_task(self.watch_stalled_clients())
+        await websocket.accept()
+        self.active_connections[websocket] = set()
+        self.channels[websocket] = ClientChannel(self, websocket, self.max_queue)
+        await self.subscribe(websocket, subscriptions)
+    async def disconnect(self, websocket: WebSocket):
+        await self.unsubscribe(websocket, list(self.active_connections.get(websocket, ())))
+        self.active_connections.pop(websocket, None)
+        channel = self.channels.pop(websocket, None)
+        if channel is not None: channel.close()
+    def evict(self, channel: ClientChannel, reason: str):
+        if channel.closed: return
+        print(f"⚠️ 응답 없는 클라이언트 연결 해제 ({reason}), 대기 메시지 {len(channel.queue)}건")
+        self.stats["evicted"] += 1
+        channel.close()
+        task = asyncio.create_task(self._close_evicted(channel.websocket))
+        self.tasks.add(task); task.add_done_callback(self.tasks.discard)
+    async def _close_evicted(self, websocket: WebSocket):
+        await self.disconnect(websocket)
+        try: await asyncio.wait_for(websocket.close(code=1013), CLIENT_SEND_TIMEOUT)  # 1013: Try Again Later
+        except Exception: pass
+    async def subscribe(self, websocket: WebSocket, keys):
+        current = self.active_connections.get(websocket)
+        if current is None: return
+        for key in keys:
+            if key in current: continue
+            if len(current) >= MAX_CLIENT_SUBSCRIPTIONS: raise HubCapacityError(f"클라이언트당 구독 한도 초과 ({MAX_CLIENT_SUBSCRIPTIONS}건)")
+            await self.hub.subscribe(*key)
+            # 허브 구독을 기다리는 동안 연결이 정리(evict/disconnect)되었다면 방금 늘린 참조를 되돌리고 멈춥니다.
+            if websocket not in self.channels:
+                await self.hub.unsubscribe(*key); return
+            current.add(key); self.subscribers.setdefault(key, set()).add(websocket)
+    async def unsubscribe(self, websocket: WebSocket, keys):
+        current = self.active_connections.get(websocket, set())
+        for key in keys:
+            if key not in current: continue
+            current.discard(key)
+            subscribers = self.subscribers.get(key, set()); subscribers.discard(websocket)
+            if not subscribers: self.subscribers.pop(key, None)
+            await self.hub.unsubscribe(*key)
+    def set_encoding(self, websocket: WebSocket, format: str, fields=None) -> TickEncoder:
+        # 잘못된 형식이면 ValueError를 그대로 올려 호출 측에서 오류 응답을 보내게 합니다.
+        encoder = TickEncoder(format, fields)
+        channel = self.channels.get(websocket)
+        if channel is not None: channel.encoder = encoder
+        return encoder
+    def send_personal(self, websocket: WebSocket, message: str):
+        channel = self.channels.get(websocket)
+        if channel is not None: channel.put(None, message)
+    def broadcast(self, message: str, key: tuple | None = None):
+        for channel in list(self.channels.values()): channel.put(key, message)
+    def publish(self, key: tuple[str, str], message: str | Tick, conflate: bool = True):
+        # conflate=False인 메시지(완성된 봉 등)는 밀린 클라이언트에서도 최신 틱으로 대체되지 않습니다.
+        conflation_key = key if conflate else None
+        for websocket in list(self.subscribers.get(key, ())):
+            channel = self.channels.get(websocket)
+            if channel is not None: channel.put(conflation_key, message)
+    def snapshot_stats(self) -> dict:
+        depths = [len(channel.queue) for channel in self.channels.values()]
+        return {**self.stats, "clients": len(self.channels), "queue_depth_total": sum(depths), "queue_depth_max": max(depths, default=0),
+                "lagging_clients": sum(1 for channel in self.channels.values() if channel.full_since is not None)}
@@ -0,0 +1,199 @@
+import asyncio
+import json
+import os
+import time
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from kis_client import KISClient, KISAPIError
+
+# --- KIS 인증 정보 관리자 ---
+# Access Token과 웹소켓 Approval Key를 실제 만료 시각과 함께 메모리에 보관합니다.
+# 만료 KIS_CREDENTIAL_REFRESH_MARGIN초 전부터는 백그라운드에서 미리 재발급하고,
+# 동시에 여러 요청이 재발급을 시도해도 락으로 한 번만 발급합니다. 파일에는 값이 바뀔 때만 저장합니다.
+
+KST = ZoneInfo("Asia/Seoul")
+KIS_CREDENTIAL_REFRESH_MARGIN = float(os.getenv("KIS_CREDENTIAL_REFRESH_MARGIN", "600"))
+# Approval Key는 응답에 만료 시각이 없으므로 KIS 안내(24시간)보다 짧게 잡습니다.
+KIS_APPROVAL_KEY_TTL = float(os.getenv("KIS_APPROVAL_KEY_TTL", str(20 * 3600)))
+KIS_CREDENTIAL_CHECK_INTERVAL = float(os.getenv("KIS_CREDENTIAL_CHECK_INTERVAL", "60"))
+
+ACCESS_TOKEN = "access_token"
+APPROVAL_KEY = "approval_key"
+
+
+class Credential:
+    __slots__ = ("value", "expires_at")
+
+    def __init__(self, value: str, expires_at: float):
+        self.value = value
+        self.expires_at = expires_at  # epoch 초
+
+    def fresh(self, margin: float, now: float | None = None) -> bool:
+        return (now or time.time()) < self.expires_at - margin
+
+
+def _token_expires_at(data: dict, issued_at: float) -> float:
+    # tokenP 응답: expires_in(초), access_token_token_expired("YYYY-MM-DD HH:MM:SS", 한국시간)
+    try: return issued_at + float(data["expires_in"])
+    except (KeyError, TypeError, ValueError): pass
+    try: return datetime.strptime(data["access_token_token_expired"], "%Y-%m-%d %H:%M:%S").replace(tzinfo=KST).timestamp()
+    except (KeyError, TypeError, ValueError): return issued_at + 86400
+
+
+def _read_credential_file(path: str) -> Credential | None:
+    try:
+        with open(path, "r") as f: data = json.load(f)
+    except (OSError, ValueError): return None
+    value = data.get("token") or data.get("approval_key")
+    if not value: return None
+    if "expires_at" in data: return Credential(value, float(data["expires_at"]))
+    # 이전 형식({"token", "issued_date"}): 발급일 당일 자정까지만 유효한 것으로 봅니다(발급 후 24시간보다 항상 이릅니다).
+    try: issued = datetime.strptime(data["issued_date"], "%Y-%m-%d")
+    except (KeyError, ValueError): return None
+    return Credential(value, (issued + timedelta(days=1)).timestamp())
+
+
+def _write_credential_file(path: str, field: str, credential: Credential):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f: json.dump({field: credential.value, "expires_at": credential.expires_at}, f)
+    os.replace(tmp_path, path)
+
+
+class CredentialManager:
+    def __init__(self, client: KISClient, app_key: str, app_secret: str, secret_key: str, access_token_file: str, approval_key_file: str,
+                 refresh_margin: float = KIS_CREDENTIAL_REFRESH_MARGIN, approval_key_ttl: float = KIS_APPROVAL_KEY_TTL):
+        self.client = client
+        self.app_key = app_key
+        self.app_secret = app_secret
+        self.secret_key = secret_key
+        self.refresh_margin = refresh_margin
+        self.approval_key_ttl = approval_key_ttl
+        self.files = {ACCESS_TOKEN: (access_token_file, "token"), APPROVAL_KEY: (approval_key_file, "approval_key")}
+        self.issuers = {ACCESS_TOKEN: self._issue_access_token, APPROVAL_KEY: self._issue_approval_key}
+        self.credentials: dict[str, Credential] = {}
+        self.loaded: set[str] = set()
+        self.locks = {name: asyncio.Lock() for name in self.issuers}
+        self.refreshing: dict[str, asyncio.Task] = {}
+        self.task: asyncio.Task | None = None
+        # requests: 호출 수, avoided: 재발급 없이 메모리/파일 값으로 응답한 횟수, coalesced: 다른 요청의 재발급 결과를 함께 받은 횟수
+        # fetches: 유효한 값이 없어 발급(또는 파일 확인)을 기다린 호출 수, fetch_ms_*: 그 대기 시간
+        self.stats = {name: {"requests": 0, "avoided": 0, "coalesced": 0, "fetches": 0, "issued": 0, "proactive": 0, "failures": 0, "disk_loads": 0,
+                             "invalidated": 0, "persisted": 0, "fetch_ms_total": 0.0, "fetch_ms_max": 0.0} for name in self.issuers}
+
+    async def access_token(self) -> str:
+        return await self.get(ACCESS_TOKEN)
+
+    async def approval_key(self) -> str:
+        # 웹소켓 재연결 때도 만료 전이면 같은 키를 다시 씁니다.
+        return await self.get(APPROVAL_KEY)
+
+    async def get(self, name: str) -> str:
+        stats = self.stats[name]
+        stats["requests"] += 1
+        credential = self.credentials.get(name)
+        if credential is not None and credential.fresh(self.refresh_margin):
+            stats["avoided"] += 1; return credential.value
+        if credential is not None and credential.fresh(0):
+            # 만료 전 여유 구간: 기존 값을 바로 돌려주고 재발급은 백그라운드에서 한 번만 합니다.
+            if name not in self.refreshing:
+                self.refreshing[name] = asyncio.create_task(self._background_refresh(name))
+            stats["avoided"] += 1; return credential.value
+        stats["fetches"] += 1
+        started = time.perf_counter()
+        try: return await self.refresh(name)
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000
+            stats["fetch_ms_total"] += elapsed; stats["fetch_ms_max"] = max(stats["fetch_ms_max"], elapsed)
+
+    def invalidate(self, name: str, value: str | None = None):
+        """KIS가 거부한 값을 버려 다음 요청에서 새로 발급하게 합니다. value를 주면 그 값이 아직 현재 값일 때만 버립니다."""
+        credential = self.credentials.get(name)
+        if credential is None or (value is not None and credential.value != value): return
+        del self.credentials[name]
+        self.loaded.add(name)  # 같은 값이 저장된 파일을 다시 읽지 않도록 합니다.
+        self.stats[name]["invalidated"] += 1
+        print(f"⚠️ {name} 무효화, 다음 요청에서 재발급합니다.")
+
+    async def _background_refresh(self, name: str):
+        try: await self.refresh(name, proactive=True)
+        except Exception as e: print(f"⚠️ {name} 사전 재발급 실패: {e}")
+        finally: self.refreshing.pop(name, None)
+
+    async def refresh(self, name: str, proactive: bool = False) -> str:
+        stats = self.stats[name]
+        async with self.locks[name]:
+            credential = self.credentials.get(name)
+            if credential is not None and credential.fresh(self.refresh_margin):
+                # 락을 기다리는 동안 다른 요청이 이미 재발급했습니다.
+                stats["coalesced"] += 1; stats["avoided"] += 1; return credential.value
+            if name not in self.loaded:
+                # 재시작 직후 한 번만 파일을 확인합니다.
+                self.loaded.add(name)
+                path, _ = self.files[name]
+                stored = await asyncio.to_thread(_read_credential_file, path)
+                if stored is not None and stored.fresh(self.refresh_margin):
+                    print(f"🔑 {name} 재사용 (from file)")
+                    self.credentials[name] = stored; stats["disk_loads"] += 1; stats["avoided"] += 1
+                    return stored.value
+            try:
+                issued = await self.issuers[name]()
+            except (KISAPIError, KeyError) as e:
+                stats["failures"] += 1
+                # 재발급에 실패해도 아직 만료되지 않은 값이 있으면 그대로 씁니다.
+                if credential is not None and credential.fresh(0):
+                    print(f"⚠️ {name} 재발급 실패, 기존 값 사용 (만료까지 {credential.expires_at - time.time():.0f}초): {e}")
+                    return credential.value
+                print(f"⚠️ {name} 발급 실패: {e}")
+                raise KISAPIError(f"{name} 발급 실패: {e}") from e
+            stats["issued"] += 1
+            if proactive: stats["proactive"] += 1
+            self.credentials[name] = issued
+            if credential is None or credential.value != issued.value or credential.expires_at != issued.expires_at:
+                path, field = self.files[name]
+                await asyncio.to_thread(_write_credential_file, path, field, issued); stats["persisted"] += 1
+            print(f"✅ {name} 신규 발급 (만료 {datetime.fromtimestamp(issued.expires_at, KST):%Y-%m-%d %H:%M:%S})")
+            return issued.value
+
+    async def _issue_access_token(self) -> Credential:
+        issued_at = time.time()
+        body = {"grant_type": "client_credentials", "appkey": self.app_key, "appsecret": self.app_secret}
+        data = await self.client.post("/oauth2/tokenP", body)
+        return Credential(data["access_token"], _token_expires_at(data, issued_at))
+
+    async def _issue_approval_key(self) -> Credential:
+        issued_at = time.time()
+        body = {"grant_type": "P", "appkey": self.app_key, "secretkey": self.secret_key}
+        data = await self.client.post("/oauth2/Approval", body)
+        return Credential(data["approval_key"], issued_at + self.approval_key_ttl)
+
+    def start(self):
+        if self.task is None: self.task = asyncio.create_task(self.refresh_loop())
+
+    async def stop(self):
+        for task in list(self.refreshing.values()):
+            if task is not self.task: task.cancel()
+        if self.task is not None:
+            self.task.cancel()
+            try: await self.task
+            except asyncio.CancelledError: pass
+            self.task = None
+
+    async def refresh_loop(self):
+        # 한 번이라도 사용된 인증 정보는 만료 여유 시간에 들어서면 요청이 오기 전에 미리 재발급합니다.
+        while True:
+            await asyncio.sleep(KIS_CREDENTIAL_CHECK_INTERVAL)
+            now = time.time()
+            for name, credential in list(self.credentials.items()):
+                if credential.fresh(self.refresh_margin, now) or name in self.refreshing: continue
+                self.refreshing[name] = asyncio.current_task()
+                await self._background_refresh(name)
+
+    def snapshot_stats(self) -> dict:
+        now = time.time()
+        result = {}
+        for name, stats in self.stats.items():
+            credential = self.credentials.get(name)
+            result[name] = {**stats, "fetch_ms_avg": stats["fetch_ms_total"] / stats["fetches"] if stats["fetches"] else 0.0,
+                            "expires_in": round(credential.expires_at - now) if credential is not None else None}
+        return result
@@ -0,0 +1,107 @@
+import asyncio
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+# --- 종목별 과거 시세 파일 저장소 ---
+# data/history/{종목코드}.csv 를 한 번만 파싱해 컬럼별 .npy 파일로 캐시하고, 이후에는 memmap으로 읽습니다.
+# 원본 CSV의 수정 시각(mtime)이나 크기가 바뀌면 캐시를 다시 만듭니다.
+
+HISTORY_DIR = os.getenv("HISTORY_DIR", "data/history")
+HISTORY_CACHE_DIR = os.getenv("HISTORY_CACHE_DIR", os.path.join(HISTORY_DIR, ".cache"))
+# data/history로 옮기기 전부터 쓰던 파일
+LEGACY_HISTORY_FILES = {"069500": "data/kodex200.csv"}
+PRICE_COLUMNS = ("open", "high", "low", "close", "volume")
+
+
+class HistoryNotFound(Exception):
+    pass
+
+
+class HistorySeries:
+    def __init__(self, columns: dict, source_mtime: float, source_size: int):
+        self.columns = columns  # date(YYYYMMDD int32) + 가격 컬럼(memmap float64)
+        self.source_mtime = source_mtime
+        self.source_size = source_size
+        self.date_labels: list[str] | None = None
+
+    def labels(self) -> list[str]:
+        # "YYYY-MM-DD" 문자열은 처음 요청될 때 한 번만 만듭니다.
+        if self.date_labels is None:
+            dates = self.columns["date"]
+            self.date_labels = [f"{d // 10000:04d}-{d // 100 % 100:02d}-{d % 100:02d}" for d in dates.tolist()]
+        return self.date_labels
+
+
+def csv_to_columns(csv_path: str) -> dict:
+    """CSV 전체를 벡터 연산으로 파싱합니다. 첫 컬럼은 날짜, 이후 시가/고가/저가/종가(/거래량) 순서입니다."""
+    df = pd.read_csv(csv_path)
+    if df.shape[1] < 5: raise ValueError(f"{csv_path}: 날짜/시가/고가/저가/종가 컬럼이 필요합니다.")
+    names = ["date", *PRICE_COLUMNS[:min(df.shape[1], 6) - 1]]
+    df = df.iloc[:, :len(names)]; df.columns = names
+    dates = pd.to_datetime(df["date"], errors="coerce")
+    prices = df[names[1:]].apply(pd.to_numeric, errors="coerce")
+    # 날짜나 가격이 비어 있거나 잘못된 행은 제외합니다.
+    valid = dates.notna().to_numpy() & prices[["open", "high", "low", "close"]].notna().all(axis=1).to_numpy()
+    dates = dates[valid]; prices = prices[valid]
+    order = np.argsort(dates.to_numpy(), kind="stable")
+    columns = {"date": (dates.dt.year * 10000 + dates.dt.month * 100 + dates.dt.day).to_numpy(dtype=np.int32)[order]}
+    for col in PRICE_COLUMNS:
+        columns[col] = prices[col].to_numpy(dtype=np.float64)[order] if col in prices else np.zeros(len(order), dtype=np.float64)
+    return columns
+
+
+class HistoricalStore:
+    def __init__(self, history_dir: str = HISTORY_DIR, cache_dir: str = HISTORY_CACHE_DIR):
+        self.history_dir = history_dir
+        self.cache_dir = cache_dir
+        self.series: dict[str, HistorySeries] = {}
+        self.locks: dict[str, asyncio.Lock] = {}
+
+    def source_path(self, stock_code: str) -> str:
+        path = os.path.join(self.history_dir, f"{stock_code}.csv")
+        if os.path.exists(path): return path
+        legacy = LEGACY_HISTORY_FILES.get(stock_code)
+        if legacy and os.path.exists(legacy): return legacy
+        raise HistoryNotFound(stock_code)
+
+    def _build_cache(self, stock_code: str, source: str, stat: os.stat_result) -> HistorySeries:
+        cache_dir = os.path.join(self.cache_dir, stock_code)
+        meta_path = os.path.join(cache_dir, "meta.json")
+        try:
+            with open(meta_path, "r") as f: meta = json.load(f)
+            if meta["mtime"] != stat.st_mtime or meta["size"] != stat.st_size: raise ValueError("stale cache")
+        except (OSError, ValueError, KeyError):
+            print(f"🗂️ {source} → 컬럼 캐시 생성 ({stock_code})")
+            columns = csv_to_columns(source)
+            os.makedirs(cache_dir, exist_ok=True)
+            for col, arr in columns.items():
+                # 기존 memmap이 열려 있을 수 있으므로 덮어쓰지 않고 새 파일로 교체합니다.
+                path = os.path.join(cache_dir, f"{col}.npy")
+                with open(path + ".tmp", "wb") as f: np.save(f, arr)
+                os.replace(path + ".tmp", path)
+            # 메타 파일은 컬럼 파일을 모두 쓴 뒤에 기록해야 중간에 중단돼도 깨진 캐시를 쓰지 않습니다.
+            with open(meta_path, "w") as f: json.dump({"source": source, "mtime": stat.st_mtime, "size": stat.st_size, "rows": len(columns["date"])}, f)
+        columns = {col: np.load(os.path.join(cache_dir, f"{col}.npy"), mmap_mode="r") for col in ("date", *PRICE_COLUMNS)}
+        return HistorySeries(columns, stat.st_mtime, stat.st_size)
+
+    async def load(self, stock_code: str) -> HistorySeries:
+        source = self.source_path(stock_code)
+        stat = os.stat(source)
+        series = self.series.get(stock_code)
+        if series is not None and series.source_mtime == stat.st_mtime and series.source_size == stat.st_size: return series
+        async with self.locks.setdefault(stock_code, asyncio.Lock()):
+            series = self.series.get(stock_code)
+            if series is None or series.source_mtime != stat.st_mtime or series.source_size != stat.st_size:
+                series = await asyncio.to_thread(self._build_cache, stock_code, source, stat)
+                self.series[stock_code] = series
+        return series
+
+    async def query(self, stock_code: str, start: int, end: int, columns=PRICE_COLUMNS) -> tuple[list[str], dict]:
+        """[start, end] 구간(YYYYMMDD)의 날짜 라벨과 요청한 컬럼 배열을 돌려줍니다."""
+        series = await self.load(stock_code)
+        dates = series.columns["date"]
+        lo = int(np.searchsorted(dates, start, side="left")); hi = int(np.searchsorted(dates, end, side="right"))
+        return series.labels()[lo:hi], {col: series.columns[col][lo:hi] for col in columns}
@@ -0,0 +1,342 @@
+import math
+import os
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict, deque
+
+import numpy as np
+
+# --- 보조지표 계산 엔진 ---
+# 처음 요청된 시리즈는 NumPy 벡터 연산으로 한 번에 계산하고, 이후 봉이 추가되면 마지막 상태에서 O(1)로 이어서 계산합니다.
+# 결과는 (소스, 종목, 봉 주기)별로 지표 파라미터마다 메모해 둡니다.
+# 지표 스펙 문자열: "sma:20", "ema:20", "rsi:14", "macd:12:26:9", "bb:20:2"
+
+INDICATOR_CACHE_MAX_ENTRIES = int(os.getenv("INDICATOR_CACHE_MAX_ENTRIES", "512"))  # (소스, 종목, 봉 주기) 단위
+INDICATOR_MAX_PERIOD = 500
+NAN = float("nan")
+
+
+def _ema(values: np.ndarray, alpha: float, seed_len: int) -> np.ndarray:
+    """seed_len개 단순평균으로 시작하는 지수이동평균. 앞쪽 seed_len-1개는 NaN입니다."""
+    out = np.full(len(values), np.nan)
+    if len(values) < seed_len: return out
+    prev = float(values[:seed_len].mean()); out[seed_len - 1] = prev
+    rest = values[seed_len:]
+    decay = 1.0 - alpha
+    if decay <= 0.0:
+        out[seed_len:] = rest; return out
+    # y_t = r^t * (y_0 + a * Σ x_k r^-k) 를 블록 단위 누적합으로 계산합니다. r^-k가 넘치지 않도록 블록 길이를 제한합니다.
+    block = max(1, min(4096, int(100 / -math.log10(decay))))
+    for offset in range(0, len(rest), block):
+        chunk = rest[offset:offset + block]
+        powers = decay ** np.arange(1, len(chunk) + 1)
+        ys = powers * (prev + np.cumsum(alpha * chunk / powers))
+        out[seed_len + offset:seed_len + offset + len(chunk)] = ys
+        prev = float(ys[-1])
+    return out
+
+
+class EMAState:
+    """_ema와 같은 규칙(단순평균 시드)으로 한 값씩 이어서 계산합니다."""
+    __slots__ = ("alpha", "seed_len", "count", "seed_sum", "value")
+
+    def __init__(self, alpha: float, seed_len: int):
+        self.alpha = alpha; self.seed_len = seed_len
+        self.count = 0; self.seed_sum = 0.0; self.value = NAN
+
+    def load(self, values: np.ndarray, ema: np.ndarray):
+        self.count = len(values)
+        if self.count < self.seed_len: self.seed_sum = float(values.sum())
+        else: self.value = float(ema[-1])
+
+    def peek(self, x: float) -> float:
+        if self.count >= self.seed_len: return self.value + self.alpha * (x - self.value)
+        if self.count + 1 == self.seed_len: return (self.seed_sum + x) / self.seed_len
+        return NAN
+
+    def push(self, x: float) -> float:
+        value = self.peek(x)
+        if self.count < self.seed_len: self.seed_sum += x
+        self.count += 1
+        if self.count >= self.seed_len: self.value = value
+        return value
+
+
+class WindowState:
+    """최근 n-1개 값의 합/제곱합. 다음 값 x를 더한 n개 창의 평균과 분산을 O(1)로 구합니다."""
+    __slots__ = ("size", "window", "total", "total_sq", "shift")
+
+    def __init__(self, size: int):
+        self.size = size
+        self.window: deque = deque(maxlen=size - 1)
+        self.total = 0.0; self.total_sq = 0.0
+        self.shift = None  # 큰 가격에서 분산 계산의 자릿수 손실을 줄이기 위한 기준값
+
+    def load(self, values: np.ndarray):
+        for x in values[-(self.size - 1):].tolist() if self.size > 1 else (): self.push(x)
+        if self.shift is None and len(values): self.shift = float(values[-1])
+
+    def stats(self, x: float) -> tuple[float, float]:
+        if len(self.window) < self.size - 1: return NAN, NAN
+        shift = self.shift if self.shift is not None else x
+        d = x - shift
+        mean = (self.total + d) / self.size
+        var = max((self.total_sq + d * d) / self.size - mean * mean, 0.0)
+        return mean + shift, var
+
+    def push(self, x: float):
+        if self.size == 1: return
+        if self.shift is None: self.shift = x
+        if len(self.window) == self.window.maxlen:
+            old = self.window[0] - self.shift
+            self.total -= old; self.total_sq -= old * old
+        self.window.append(x)
+        d = x - self.shift
+        self.total += d; self.total_sq += d * d
+
+
+class SMA:
+    outputs = ("sma",)
+
+    def __init__(self, period: int = 20):
+        self.period = period
+        self.state = WindowState(period)
+
+    def compute(self, close: np.ndarray) -> dict:
+        out = np.full(len(close), np.nan)
+        if len(close) >= self.period:
+            sums = np.cumsum(close); sums[self.period:] = sums[self.period:] - sums[:-self.period]
+            out[self.period - 1:] = sums[self.period - 1:] / self.period
+        self.state.load(close)
+        return {"sma": out}
+
+    def peek(self, x: float) -> dict: return {"sma": self.state.stats(x)[0]}
+
+    def push(self, x: float) -> dict:
+        values = self.peek(x); self.state.push(x); return values
+
+
+class EMA:
+    outputs = ("ema",)
+
+    def __init__(self, period: int = 20):
+        self.period = period
+        self.state = EMAState(2 / (period + 1), period)
+
+    def compute(self, close: np.ndarray) -> dict:
+        out = _ema(close, self.state.alpha, self.period)
+        self.state.load(close, out)
+        return {"ema": out}
+
+    def peek(self, x: float) -> dict: return {"ema": self.state.peek(x)}
+
+    def push(self, x: float) -> dict: return {"ema": self.state.push(x)}
+
+
+def _rsi(avg_gain, avg_loss):
+    # 평균 하락폭이 0이면 100으로 봅니다.
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(avg_loss == 0, 100.0, 100.0 - 100.0 / (1.0 + avg_gain / avg_loss))
+
+
+class RSI:
+    """Wilder 방식 RSI (평균 상승/하락폭을 alpha=1/n 지수평균으로 계산)."""
+    outputs = ("rsi",)
+
+    def __init__(self, period: int = 14):
+        self.period = period
+        self.gain = EMAState(1 / period, period)
+        self.loss = EMAState(1 / period, period)
+        self.prev_close = None
+
+    def compute(self, close: np.ndarray) -> dict:
+        out = np.full(len(close), np.nan)
+        if len(close) == 0: return {"rsi": out}
+        diff = np.diff(close)
+        gains, losses = np.maximum(diff, 0.0), np.maximum(-diff, 0.0)
+        avg_gain, avg_loss = _ema(gains, 1 / self.period, self.period), _ema(losses, 1 / self.period, self.period)
+        out[1:] = np.where(np.isnan(avg_gain), np.nan, _rsi(avg_gain, avg_loss))
+        self.gain.load(gains, avg_gain); self.loss.load(losses, avg_loss)
+        self.prev_close = float(close[-1])
+        return {"rsi": out}
+
+    def _value(self, avg_gain: float, avg_loss: float) -> float:
+        if avg_gain != avg_gain: return NAN
+        return float(_rsi(np.float64(avg_gain), np.float64(avg_loss)))
+
+    def peek(self, x: float) -> dict:
+        if self.prev_close is None: return {"rsi": NAN}
+        d = x - self.prev_close
+        return {"rsi": self._value(self.gain.peek(max(d, 0.0)), self.loss.peek(max(-d, 0.0)))}
+
+    def push(self, x: float) -> dict:
+        if self.prev_close is None:
+            self.prev_close = x; return {"rsi": NAN}
+        d = x - self.prev_close; self.prev_close = x
+        return {"rsi": self._value(self.gain.push(max(d, 0.0)), self.loss.push(max(-d, 0.0)))}
+
+
+class MACD:
+    outputs = ("macd", "signal", "hist")
+
+    def __init__(self, fast: int = 12, slow: int = 26, signal: int = 9):
+        if fast >= slow: raise ValueError("macd는 fast < slow 이어야 합니다.")
+        self.fast = EMAState(2 / (fast + 1), fast)
+        self.slow = EMAState(2 / (slow + 1), slow)
+        self.signal = EMAState(2 / (signal + 1), signal)
+
+    def compute(self, close: np.ndarray) -> dict:
+        fast, slow = _ema(close, self.fast.alpha, self.fast.seed_len), _ema(close, self.slow.alpha, self.slow.seed_len)
+        macd = fast - slow
+        signal = np.full(len(close), np.nan)
+        start = self.slow.seed_len - 1
+        if len(close) > start:
+            signal[start:] = _ema(macd[start:], self.signal.alpha, self.signal.seed_len)
+            self.signal.load(macd[start:], signal[start:])
+        self.fast.load(close, fast); self.slow.load(close, slow)
+        return {"macd": macd, "signal": signal, "hist": macd - signal}
+
+    def _combine(self, fast: float, slow: float, signal_fn) -> dict:
+        macd = fast - slow
+        if macd != macd: return {"macd": NAN, "signal": NAN, "hist": NAN}
+        signal = signal_fn(macd)
+        return {"macd": macd, "signal": signal, "hist": macd - signal}
+
+    def peek(self, x: float) -> dict: return self._combine(self.fast.peek(x), self.slow.peek(x), self.signal.peek)
+
+    def push(self, x: float) -> dict: return self._combine(self.fast.push(x), self.slow.push(x), self.signal.push)
+
+
+class Bollinger:
+    outputs = ("upper", "middle", "lower")
+
+    def __init__(self, period: int = 20, width: float = 2.0):
+        self.period = period
+        self.width = width
+        self.state = WindowState(period)
+
+    def compute(self, close: np.ndarray) -> dict:
+        middle = np.full(len(close), np.nan); std = np.full(len(close), np.nan)
+        if len(close) >= self.period:
+            windows = np.lib.stride_tricks.sliding_window_view(close, self.period)
+            middle[self.period - 1:] = windows.mean(axis=1); std[self.period - 1:] = windows.std(axis=1)
+        self.state.load(close)
+        return {"upper": middle + self.width * std, "middle": middle, "lower": middle - self.width * std}
+
+    def peek(self, x: float) -> dict:
+        mean, var = self.state.stats(x)
+        std = math.sqrt(var) if var == var else NAN
+        return {"upper": mean + self.width * std, "middle": mean, "lower": mean - self.width * std}
+
+    def push(self, x: float) -> dict:
+        values = self.peek(x); self.state.push(x); return values
+
+
+INDICATORS = {"sma": (SMA, (20,)), "ema": (EMA, (20,)), "rsi": (RSI, (14,)), "macd": (MACD, (12, 26, 9)), "bb": (Bollinger, (20, 2.0))}
+
+
+def parse_spec(spec: str) -> tuple[str, tuple]:
+    """"macd:12:26:9" -> ("macd", (12, 26, 9)). 생략한 파라미터는 기본값을 씁니다."""
+    name, *raw = spec.strip().lower().split(":")
+    if name not in INDICATORS: raise ValueError(f"지원하지 않는 지표: {name}")
+    defaults = INDICATORS[name][1]
+    if len(raw) > len(defaults): raise ValueError(f"{name} 파라미터가 너무 많습니다: {spec}")
+    params = []
+    for i, default in enumerate(defaults):
+        if i >= len(raw) or raw[i] == "": params.append(default); continue
+        try: value = type(default)(raw[i]) if isinstance(default, int) else float(raw[i])
+        except ValueError: raise ValueError(f"잘못된 지표 파라미터: {spec}")
+        if not 0 < value <= INDICATOR_MAX_PERIOD: raise ValueError(f"지표 파라미터는 0보다 크고 {INDICATOR_MAX_PERIOD} 이하여야 합니다: {spec}")
+        params.append(value)
+    if name == "macd" and params[0] >= params[1]: raise ValueError(f"macd는 fast < slow 이어야 합니다: {spec}")
+    return name, tuple(params)
+
+
+def spec_key(name: str, params: tuple) -> str:
+    return ":".join([name, *(f"{p:g}" for p in params)])
+
+
+def _to_list(values: np.ndarray) -> list:
+    # NaN은 JSON null로 보냅니다. NaN은 대부분 앞쪽 초기 구간에만 있으므로 해당 위치만 바꿉니다.
+    result = values.tolist()
+    for i in np.flatnonzero(np.isnan(values)).tolist(): result[i] = None
+    return result
+
+
+class IndicatorSeries:
+    """지표 하나의 확정된 봉까지의 결과와, 다음 봉을 O(1)로 이어서 계산할 상태."""
+    def __init__(self, name: str, params: tuple, labels: list, close: np.ndarray):
+        self.indicator = INDICATORS[name][0](*params)
+        self.labels = list(labels)
+        self.values = {out: _to_list(arr) for out, arr in self.indicator.compute(np.asarray(close, dtype=np.float64)).items()}
+
+    def append(self, label, close: float):
+        self.labels.append(label)
+        for out, value in self.indicator.push(float(close)).items(): self.values[out].append(None if value != value else value)
+
+    def live(self, close: float) -> dict:
+        # 아직 끝나지 않은 봉의 값. 상태는 바꾸지 않습니다.
+        return {out: None if value != value else value for out, value in self.indicator.peek(float(close)).items()}
+
+    def trim(self, keep: int):
+        # 분봉처럼 계속 쌓이는 시리즈는 앞쪽을 잘라 메모리를 제한합니다(잘라도 상태는 그대로입니다).
+        excess = len(self.labels) - keep
+        if excess <= 0: return
+        del self.labels[:excess]
+        for values in self.values.values(): del values[:excess]
+
+
+class IndicatorEngine:
+    def __init__(self, max_entries: int = INDICATOR_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        # (소스, 종목, 봉 주기) -> 지표 스펙 -> IndicatorSeries. 가장 오래 사용되지 않은 항목이 앞쪽에 위치합니다.
+        self.memo: OrderedDict[tuple, dict[str, IndicatorSeries]] = OrderedDict()
+        self.stats = {"cold": 0, "hits": 0, "incremental": 0, "bars_appended": 0, "evictions": 0}
+
+    def _entry(self, series_key: tuple) -> dict:
+        entry = self.memo.get(series_key)
+        if entry is None:
+            entry = self.memo[series_key] = {}
+            if len(self.memo) > self.max_entries:
+                self.memo.popitem(last=False); self.stats["evictions"] += 1
+        self.memo.move_to_end(series_key)
+        return entry
+
+    def series(self, series_key: tuple, spec: str, labels, close: np.ndarray) -> IndicatorSeries:
+        """확정된 봉 전체(labels, close)에 대한 지표. 메모된 결과 뒤에 새 봉만 붙었다면 그 봉들만 이어서 계산합니다."""
+        name, params = parse_spec(spec)
+        key = spec_key(name, params)
+        entry = self._entry(series_key)
+        cached = entry.get(key)
+        if cached is not None and cached.labels:
+            last = cached.labels[-1]
+            # labels는 오름차순이므로 메모의 마지막 봉 위치를 이분 탐색으로 찾습니다.
+            position = bisect_left(labels, last)
+            if position < len(labels) and labels[position] == last:
+                if position == len(labels) - 1:
+                    self.stats["hits"] += 1; return cached
+                if len(labels) - position - 1 <= len(cached.labels):
+                    self.stats["incremental"] += 1
+                    for label, value in zip(labels[position + 1:], close[position + 1:].tolist()): cached.append(label, value)
+                    self.stats["bars_appended"] += len(labels) - position - 1
+                    return cached
+        self.stats["cold"] += 1
+        entry[key] = IndicatorSeries(name, params, labels, close)
+        return entry[key]
+
+    def on_bar(self, series_key: tuple, label, close: float):
+        # 확정된 봉이 들어오면 메모된 지표에 바로 이어 붙입니다. 메모가 없는 시리즈는 다음 요청 때 계산합니다.
+        entry = self.memo.get(series_key)
+        if entry is None: return
+        for cached in entry.values():
+            if cached.labels and label > cached.labels[-1]:
+                cached.append(label, close); self.stats["bars_appended"] += 1
+
+    def drop(self, series_key: tuple):
+        self.memo.pop(series_key, None)
+
+    def snapshot_stats(self) -> dict:
+        return {**self.stats, "series": len(self.memo), "indicators": sum(len(entry) for entry in self.memo.values())}
+
+
+def slice_range(labels: list, start, end) -> tuple[int, int]:
+    return bisect_left(labels, start), bisect_right(labels, end)
@@ -0,0 +1,106 @@
+import asyncio
+import os
+import random
+import time
+
+import aiohttp
+
+# --- KIS REST 비동기 클라이언트 ---
+# 프로세스 전체에서 하나의 keep-alive 커넥션 풀을 공유합니다.
+# 이벤트 루프를 막지 않도록 모든 KIS REST 호출은 이 클라이언트를 거쳐야 합니다.
+
+KIS_REQUEST_TIMEOUT = float(os.getenv("KIS_REQUEST_TIMEOUT", "5"))
+KIS_MAX_RETRIES = int(os.getenv("KIS_MAX_RETRIES", "2"))
+KIS_MAX_CONCURRENCY = int(os.getenv("KIS_MAX_CONCURRENCY", "10"))
+# KIS 실전 계좌 기준 초당 20건 제한 (모의투자는 초당 2건). 여유를 두고 설정합니다.
+KIS_RATE_LIMIT_PER_SEC = float(os.getenv("KIS_RATE_LIMIT_PER_SEC", "18"))
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class KISAPIError(Exception):
+    pass
+
+
+class RateLimiter:
+    """초당 호출 횟수를 제한하는 단순 토큰 버킷."""
+    def __init__(self, rate_per_sec: float):
+        self.rate = rate_per_sec
+        self.capacity = max(1.0, rate_per_sec)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        if self.rate <= 0: return
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1; return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class KISClient:
+    def __init__(self, base_url: str, app_key: str, app_secret: str, token_provider=None,
+                 timeout: float = KIS_REQUEST_TIMEOUT, max_retries: int = KIS_MAX_RETRIES,
+                 max_concurrency: int = KIS_MAX_CONCURRENCY, rate_limit_per_sec: float = KIS_RATE_LIMIT_PER_SEC):
+        self.base_url = base_url
+        self.app_key = app_key
+        self.app_secret = app_secret
+        # token_provider: Access Token을 돌려주는 async 함수
+        self.token_provider = token_provider
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.max_concurrency = max_concurrency
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.rate_limiter = RateLimiter(rate_limit_per_sec)
+        self.session: aiohttp.ClientSession | None = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # 세션은 실행 중인 이벤트 루프 안에서 처음 호출될 때 생성합니다.
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency, keepalive_timeout=60, ttl_dns_cache=300)
+            self.session = aiohttp.ClientSession(base_url=self.base_url, connector=connector, timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self.session
+
+    async def close(self):
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+        self.session = None
+
+    async def _auth_headers(self, tr_id: str) -> dict:
+        token = await self.token_provider()
+        return {"Authorization": f"Bearer {token}", "appkey": self.app_key, "appsecret": self.app_secret, "tr_id": tr_id}
+
+    async def request(self, method: str, path: str, headers: dict | None = None, params: dict | None = None,
+                      json_body: dict | None = None, timeout: float | None = None) -> dict:
+        """재시도(지수 백오프)와 동시성/초당 호출 제한을 적용한 KIS 호출."""
+        session = self._get_session()
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self.semaphore:
+                    await self.rate_limiter.acquire()
+                    request_timeout = aiohttp.ClientTimeout(total=timeout or self.timeout)
+                    async with session.request(method, path, headers=headers, params=params, json=json_body, timeout=request_timeout) as res:
+                        res.raise_for_status()
+                        return await res.json(content_type=None)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                last_error = e
+                retryable = not isinstance(e, aiohttp.ClientResponseError) or e.status in RETRY_STATUS_CODES
+                if not retryable or attempt == self.max_retries: break
+                backoff = min(2.0, 0.2 * (2 ** attempt)) + random.uniform(0, 0.1)
+                print(f"⚠️ KIS {path} 호출 실패 ({e}), {backoff:.2f}초 후 재시도 ({attempt + 1}/{self.max_retries})")
+                await asyncio.sleep(backoff)
+        raise KISAPIError(f"KIS {path} 호출 실패: {last_error}") from last_error
+
+    async def get(self, path: str, tr_id: str, params: dict, timeout: float | None = None) -> dict:
+        headers = await self._auth_headers(tr_id)
+        return await self.request("GET", path, headers=headers, params=params, timeout=timeout)
+
+    async def post(self, path: str, json_body: dict, timeout: float | None = None) -> dict:
+        # 인증 토큰 발급처럼 Authorization 헤더가 필요 없는 호출용
+        return await self.request("POST", path, json_body=json_body, timeout=timeout)
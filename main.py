@@ -1,13 +1,12 @@
 import os
 import json
-import requests
 import asyncio
-import websockets
-import csv
-import pandas as pd
+import time
+import numpy as np
 from datetime import datetime, timedelta
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Depends, status
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Depends, Request, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from dotenv import load_dotenv
@@ -17,6 +16,19 @@ from google.cloud.exceptions import NotFound
 import io
 
 import models
+from kis_client import KISClient, KISAPIError
+from credentials import CredentialManager, APPROVAL_KEY
+from ai_gateway import PredictorGateway, PredictorBusy, PredictorUnavailable
+from quote_cache import QuoteCache
+from candle_store import CandleStore, aggregate_candles, to_date_int
+from historical_store import HistoricalStore, HistoryNotFound, PRICE_COLUMNS
+from tick_hub import TickHub, HubCapacityError, STOCK_TICK_TR_ID, INDEX_TICK_TR_ID
+from connection_manager import ConnectionManager
+from tick_codec import Tick, parse_ticks
+from bar_aggregator import BarAggregator, Bar, KST, BAR_CAPACITY, BAR_INTERVALS
+from indicators import IndicatorEngine, parse_spec, spec_key, slice_range
+from snapshot_store import SnapshotRecorder
+from chart_payload import CHART_FORMATS, CHART_DOWNSAMPLE_MODES, OHLCV_COLUMNS, downsample, encode_columnar, records_payload, records_to_columns
 import schemas
 import security
 from database import engine, get_db
@@ -30,20 +42,6 @@ app = FastAPI()
 origins = ["http://localhost", "http://localhost:5173", "http://220.69.216.48:5173", "http://220.69.216.48:5174"]
 app.add_middleware(CORSMiddleware, allow_origins=origins, allow_credentials=True, allow_methods=["*"], allow_headers=["*"])
 
-# --- WebSocket 연결 관리자 ---
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: list[WebSocket] = []
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
-    def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
-    async def broadcast(self, message: str):
-        for connection in self.active_connections:
-            await connection.send_text(message)
-manager = ConnectionManager()
-
 # --- KIS API 설정 및 헬퍼 ---
 KIS_APP_KEY = os.getenv("KIS_APP_KEY")
 KIS_APP_SECRET = os.getenv("KIS_APP_SECRET")
@@ -55,50 +53,74 @@ ACCESS_TOKEN_FILE = "kis_access_token.json"
 
 def are_keys_configured(): return all([KIS_APP_KEY, KIS_APP_SECRET, KIS_SECRET_KEY])
 
-def get_approval_key(force_reissue=False):
-    # 웹소켓 연결 시에는 항상 새로 발급받는 것이 안정적입니다.
-    print("... Approval Key 신규 발급 시도 (실시간 연결용) ...")
-    url = f"{KIS_BASE_URL}/oauth2/Approval"; body = {"grant_type": "P", "appkey": KIS_APP_KEY, "secretkey": KIS_SECRET_KEY}
-    try:
-        res = requests.post(url, json=body, timeout=5); res.raise_for_status()
-        data = res.json(); new_key = data["approval_key"]
-        print("✅ Approval Key 신규 발급 성공"); return new_key
-    except requests.exceptions.RequestException as e:
-        print(f"⚠️ Approval Key 발급 실패: {e}"); raise e
-
-def get_access_token():
-    today = datetime.now().strftime("%Y-%m-%d")
-    try:
-        with open(ACCESS_TOKEN_FILE, 'r') as f:
-            token_data = json.load(f)
-            if token_data.get('issued_date') == today:
-                print("🔑 Access Token 재사용 (from file)"); return token_data['token']
-    except Exception: pass
-    print("... Access Token 신규 발급 시도 ...")
-    url = f"{KIS_BASE_URL}/oauth2/tokenP"; body = {"grant_type": "client_credentials", "appkey": KIS_APP_KEY, "appsecret": KIS_APP_SECRET}
-    res = requests.post(url, json=body, timeout=5); res.raise_for_status(); data = res.json()
-    new_token = data["access_token"]
-    with open(ACCESS_TOKEN_FILE, 'w') as f: json.dump({'token': new_token, 'issued_date': today}, f)
-    print("✅ Access Token 신규 발급 및 파일 저장 완료"); return new_token
-
-def get_current_price(stock_code: str):
-    try:
-        token = get_access_token()
-        url = f"{KIS_BASE_URL}/uapi/domestic-stock/v1/quotations/inquire-price"
-        headers = {"Authorization": f"Bearer {token}", "appkey": KIS_APP_KEY, "appsecret": KIS_APP_SECRET, "tr_id": "FHKST01010100"}
-        params = {"fid_cond_mrkt_div_code": "J", "fid_input_iscd": stock_code}
-        res = requests.get(url, headers=headers, params=params, timeout=5); res.raise_for_status()
-        data = res.json()
-        if data.get('rt_cd') == '0': return data['output']
-    except Exception as e: print(f"⚠️ {stock_code} 현재가 조회 실패: {e}")
-    return None
-
-def save_snapshot_to_csv(data: dict):
-    file_path = 'price_snapshots.csv'; is_new_file = not os.path.exists(file_path)
-    with open(file_path, 'a', newline='', encoding='utf-8') as f:
-        writer = csv.writer(f)
-        if is_new_file: writer.writerow(['timestamp', 'price', 'change', 'change_rate', 'date'])
-        writer.writerow([datetime.now().isoformat(), data.get("stck_prpr"), data.get("prdy_vrss"), data.get("prdy_ctrt"), data.get("stck_bsop_date")])
+kis = KISClient(KIS_BASE_URL, KIS_APP_KEY, KIS_APP_SECRET)
+credentials = CredentialManager(kis, KIS_APP_KEY, KIS_APP_SECRET, KIS_SECRET_KEY, ACCESS_TOKEN_FILE, APPROVAL_KEY_FILE)
+kis.token_provider = credentials.access_token
+
+# --- 시세 캐시 설정 ---
+QUOTE_TTL_STOCK_INFO = float(os.getenv("QUOTE_TTL_STOCK_INFO", "3"))
+QUOTE_TTL_MARKET_INDICES = float(os.getenv("QUOTE_TTL_MARKET_INDICES", "5"))
+# 실시간 체결이 들어오는 종목은 틱마다 캐시를 갱신하므로 TTL을 길게 가져갑니다.
+QUOTE_TTL_STREAMING = float(os.getenv("QUOTE_TTL_STREAMING", "30"))
+quote_cache = QuoteCache()
+
+def update_quote_cache_from_tick(tick: Tick):
+    values = {"currentPrice": tick.price, "open": tick.open, "high": tick.high, "low": tick.low, "volume": tick.accVolume, "tradeValue": tick.accTradeValue}
+    quote_cache.update(("stock_info", tick.code), lambda info: {**info, **values}, QUOTE_TTL_STREAMING)
+
+# --- 실시간 시세 허브 ---
+# 모든 클라이언트가 하나의 KIS 웹소켓 연결(최대 KIS_WS_MAX_CONNECTIONS개)을 공유합니다.
+DEFAULT_STREAM_CODE = "069500" # KODEX 200, 구독 요청을 보내지 않는 기존 클라이언트의 기본 종목
+KOSPI200_INDEX_CODE = "2001"
+
+async def on_hub_message(tr_id: str, tr_key: str, msg: str):
+    # 원본 메시지는 여기서 한 번만 파싱하고, 클라이언트별 형식 변환은 전송 시점에 합니다.
+    for tick in parse_ticks(msg):
+        if tr_id == STOCK_TICK_TR_ID: update_quote_cache_from_tick(tick)
+        snapshot_recorder.record_tick(tick)
+        manager.publish((tr_id, tick.code), tick)
+        # 구독 해제 직후 도착한 틱으로 봉을 다시 만들지 않도록, 허브가 구독 중인 종목만 집계합니다.
+        if (tr_id, tick.code) not in tick_hub.refcounts: continue
+        for interval, bar in bar_aggregator.on_tick(tick): on_bar_finalized((tr_id, tick.code), interval, bar)
+    # /ws/kospi200 클라이언트는 KIS 원본 메시지를 그대로 받습니다.
+    kospi200_manager.publish((tr_id, tr_key), msg)
+
+def on_bar_finalized(key: tuple[str, str], interval: str, bar: Bar):
+    manager.publish(key, json.dumps({"type": "bar", "code": key[1], "interval": interval, "bar": bar.to_record()}), conflate=False)
+    indicator_engine.on_bar(("bars", key, interval), bar.start, bar.close)
+    if interval != "5m": return
+    # 기존 5분 주기 현재가 조회(REST)를 대신해 완성된 5분봉으로 스냅샷을 남깁니다.
+    snapshot_recorder.record(key[1], "snapshot_5m", datetime.fromtimestamp(bar.start, KST).strftime("%H%M%S"), bar.close, bar.change, bar.changeRate, bar.volume)
+    if key == (STOCK_TICK_TR_ID, DEFAULT_STREAM_CODE):
+        snapshot = {"stck_prpr": bar.close, "prdy_vrss": bar.change, "prdy_ctrt": bar.changeRate, "stck_bsop_date": datetime.fromtimestamp(bar.start, KST).strftime("%Y%m%d")}
+        manager.broadcast(json.dumps({"type": "snapshot_5min", "data": snapshot}))
+
+def on_hub_unsubscribed(tr_id: str, tr_key: str):
+    # 마지막 구독자가 떠난 종목의 봉과 분봉 지표 메모는 더 이상 갱신되지 않으므로 버립니다.
+    key = (tr_id, tr_key)
+    bar_aggregator.drop(key)
+    for interval in BAR_INTERVALS: indicator_engine.drop(("bars", key, interval))
+
+def is_streaming(key: tuple[str, str]) -> bool:
+    # 허브가 지금 구독 중이고 틱을 집계하고 있는 종목만 메모리의 분봉으로 응답합니다.
+    return tick_hub.refcounts.get(key, 0) > 0 and bar_aggregator.is_tracking(key)
+
+bar_aggregator = BarAggregator()
+snapshot_recorder = SnapshotRecorder()
+tick_hub = TickHub(KIS_WS_URL, credentials.approval_key, on_hub_message, on_unsubscribe=on_hub_unsubscribed,
+                   invalidate_approval_key=lambda key: credentials.invalidate(APPROVAL_KEY, key))
+manager = ConnectionManager(tick_hub)
+kospi200_manager = ConnectionManager(tick_hub)
+
+# --- 일봉 로컬 저장소 ---
+CANDLE_SYNC_INTERVAL = float(os.getenv("CANDLE_SYNC_INTERVAL", "60"))
+# 동기화가 실패하면 이 시간 동안은 KIS를 다시 호출하지 않고 저장된 데이터로 응답합니다.
+CANDLE_SYNC_RETRY_DELAY = float(os.getenv("CANDLE_SYNC_RETRY_DELAY", "10"))
+KIS_DAILY_CANDLE_PAGE_SIZE = 100
+candle_store = CandleStore()
+historical_store = HistoricalStore()
+candle_synced_at: dict[str, float] = {}
+candle_sync_failed_at: dict[str, float] = {}
 
 # --- 사용자 인증 엔드포인트 ---
 def get_user_by_username(db: Session, username: str):
@@ -131,217 +153,420 @@ async def get_all_stocks_api():
 @app.get("/stocks/{stock_code}/info", tags=["Stock Data"])
 async def get_stock_info(stock_code: str):
     if not are_keys_configured(): return {"marketType": "N/A", "stockCode": stock_code, "stockName": "KIS API 키 필요", "currentPrice": 0, "open": 0, "high": 0, "low": 0, "week52high": 0, "week52low": 0, "volume": 0, "tradeValue": 0, "marketCap": 0, "foreignRatio": 0, "per": 0, "pbr": 0, "dividendYield": 0}
-    token = get_access_token()
-    url = f"{KIS_BASE_URL}/uapi/domestic-stock/v1/quotations/inquire-price"
-    headers = {"Authorization": f"Bearer {token}", "appkey": KIS_APP_KEY, "appsecret": KIS_APP_SECRET, "tr_id": "FHKST01010100"}
+    return await quote_cache.get_or_fetch(("stock_info", stock_code), lambda: fetch_stock_info(stock_code), QUOTE_TTL_STOCK_INFO)
+
+async def fetch_stock_info(stock_code: str):
     params = {"fid_cond_mrkt_div_code": "J", "fid_input_iscd": stock_code}
-    res = requests.get(url, headers=headers, params=params, timeout=5); res.raise_for_status(); data = res.json()
+    try: data = await kis.get("/uapi/domestic-stock/v1/quotations/inquire-price", "FHKST01010100", params)
+    except KISAPIError as e: raise HTTPException(status_code=503, detail=f"KIS API 호출 실패: {e}")
     if data.get('rt_cd') == '0':
         output = data['output']
         return {"marketType": output.get('rprs_mrkt_kor_name', 'N/A'), "stockCode": stock_code, "stockName": output.get('bstp_kor_isnm', '알 수 없음'), "currentPrice": float(output.get('stck_prpr', 0)), "open": float(output.get('stck_oprc', 0)), "high": float(output.get('stck_hgpr', 0)), "low": float(output.get('stck_lwpr', 0)), "week52high": float(output.get('w52_hgpr', 0)), "week52low": float(output.get('w52_lwpr', 0)), "volume": float(output.get('acml_vol', 0)), "tradeValue": float(output.get('acml_tr_pbmn', 0)), "marketCap": float(output.get('mket_prtt_val', 0)), "foreignRatio": float(output.get('frgn_hldn_qty_rate', 0)), "per": float(output.get('per', 0)), "pbr": float(output.get('pbr', 0)), "dividendYield": float(output.get('dvrg_rto', 0))}
     raise HTTPException(status_code=404, detail=f"KIS API 오류: {data.get('msg1')}")
 
 @app.get("/stocks/{stock_code}/candles", tags=["Stock Data"])
-async def get_stock_candles(stock_code: str, period: str = "day", interval: str = "1"):
-    if not are_keys_configured(): return []
-    token = get_access_token()
-    if period == "day":
-        url = f"{KIS_BASE_URL}/uapi/domestic-stock/v1/quotations/inquire-daily-itemchartprice"; tr_id = "FHKST03010100"
-        kis_interval = {"1": "D", "7": "W", "30": "M"}.get(interval, "D")
-        params = {"FID_COND_MRKT_DIV_CODE": "J", "FID_INPUT_ISCD": stock_code, "FID_INPUT_DATE_1": (datetime.now() - timedelta(days=365*5)).strftime("%Y%m%d"), "FID_INPUT_DATE_2": datetime.now().strftime("%Y%m%d"), "FID_PERIOD_DIV_CODE": kis_interval, "FID_ORG_ADJ_PRC": "1"}
-    elif period == "minute":
-        url = f"{KIS_BASE_URL}/uapi/domestic-stock/v1/quotations/inquire-time-itemchartprice"; tr_id = "FHKST03010200"
-        params = {"FID_COND_MRKT_DIV_CODE": "J", "FID_INPUT_ISCD": stock_code, "FID_ETC_CLS_CODE": "", "FID_INPUT_DATE_1": "", "FID_INPUT_HOUR_1": "090000", "FID_INPUT_HOUR_2": "153000", "FID_PERIOD_DIV_CODE": interval}
-    else: raise HTTPException(status_code=400, detail="Invalid period specified.")
-    headers = {"Authorization": f"Bearer {token}", "appkey": KIS_APP_KEY, "appsecret": KIS_APP_SECRET, "tr_id": tr_id}
+async def get_stock_candles(request: Request, stock_code: str, period: str = "day", interval: str = "1", start: str | None = None, end: str | None = None,
+                            format: str = "records", max_points: int | None = None, downsample: str = "ohlc"):
+    check_chart_params(format, max_points, downsample)
+    chart = dict(request=request, format=format, max_points=max_points, downsample_mode=downsample)
+    if not are_keys_configured(): return await chart_response(*records_to_columns([]), **chart)
+    if period == "minute":
+        # 실시간 구독 중인 종목은 틱으로 집계한 오늘의 분봉을 메모리에서 바로 돌려줍니다.
+        bar_interval = {"1": "1m", "5": "5m", "60": "1h"}.get(interval)
+        key = (STOCK_TICK_TR_ID, stock_code)
+        if bar_interval and is_streaming(key):
+            return await chart_response(*await streaming_minute_bars(stock_code, bar_interval), format_label=format_bar_label, **chart)
+        return await chart_response(*records_to_columns(await fetch_minute_candles(stock_code, interval)), **chart)
+    if period != "day": raise HTTPException(status_code=400, detail="Invalid period specified.")
+    # 주봉/월봉은 KIS를 따로 호출하지 않고 저장된 일봉으로 직접 집계합니다.
+    candle_period = {"1": "D", "7": "W", "30": "M"}.get(interval, "D")
+    try:
+        start_date = to_date_int(start, int((datetime.now() - timedelta(days=365*5)).strftime("%Y%m%d")))
+        end_date = to_date_int(end, int(datetime.now().strftime("%Y%m%d")))
+    except ValueError as e: raise HTTPException(status_code=400, detail=str(e))
+    await sync_daily_candles(stock_code)
+    series = aggregate_candles(await candle_store.range(stock_code, start_date, end_date), candle_period)
+    return await chart_response(series["date"], series, format_label=format_day_label, **chart)
+
+# --- 차트 응답 형식 ---
+# format=records(기본): 봉마다 {"date", "open", ...} 객체, format=columnar: 프론트엔드 AppChartData 형태의 병렬 배열(orjson + gzip/br).
+# max_points를 주면 downsample=ohlc(구간 병합, 최고가/최저가 보존) 또는 lttb(종가 선 모양 보존)로 봉 수를 줄입니다.
+CHART_THREAD_MIN_POINTS = int(os.getenv("CHART_THREAD_MIN_POINTS", "20000"))  # 이보다 큰 응답은 직렬화/압축을 스레드에서 합니다.
+
+def check_chart_params(format: str, max_points: int | None, downsample: str):
+    if format not in CHART_FORMATS: raise HTTPException(status_code=400, detail=f"format은 {', '.join(CHART_FORMATS)} 중 하나여야 합니다.")
+    if downsample not in CHART_DOWNSAMPLE_MODES: raise HTTPException(status_code=400, detail=f"downsample은 {', '.join(CHART_DOWNSAMPLE_MODES)} 중 하나여야 합니다.")
+    if max_points is not None and max_points < 3: raise HTTPException(status_code=400, detail="max_points는 3 이상이어야 합니다.")
+
+async def chart_response(labels, cols: dict, request: Request, format: str, max_points: int | None, downsample_mode: str, format_label=None, fields=OHLCV_COLUMNS):
+    # 날짜 문자열은 다운샘플링으로 남은 봉에 대해서만 만듭니다.
+    labels, cols = downsample(labels, cols, max_points, downsample_mode)
+    dates = [format_label(label) for label in (labels.tolist() if isinstance(labels, np.ndarray) else labels)] if format_label else labels
+    if format == "records": return records_payload(dates, cols, fields)
+    accept_encoding = request.headers.get("accept-encoding", "")
+    if len(dates) >= CHART_THREAD_MIN_POINTS: body, encoding = await asyncio.to_thread(encode_columnar, dates, cols, accept_encoding)
+    else: body, encoding = encode_columnar(dates, cols, accept_encoding)
+    headers = {"Vary": "Accept-Encoding", **({"Content-Encoding": encoding} if encoding else {})}
+    return Response(content=body, media_type="application/json", headers=headers)
+
+async def sync_daily_candles(stock_code: str):
+    """로컬 일봉 저장소를 최신 상태로 맞춥니다. 최초 1회만 5년치를 받고, 이후에는 마지막 저장일 이후만 받습니다."""
+    requested_at = time.monotonic()
+    async with candle_store.lock_for(stock_code):
+        now = time.monotonic()
+        if now - candle_synced_at.get(stock_code, float("-inf")) < CANDLE_SYNC_INTERVAL: return
+        # 락을 기다리는 동안 앞선 동기화가 실패했다면 줄줄이 다시 시도하지 않고 저장된 데이터로 응답합니다.
+        failed_at = candle_sync_failed_at.get(stock_code, float("-inf"))
+        if failed_at >= requested_at or now - failed_at < CANDLE_SYNC_RETRY_DELAY: return
+        await candle_store.load(stock_code)
+        last_date = candle_store.last_date(stock_code)
+        # 마지막 저장일의 봉은 장중 미완성일 수 있으므로 그 날짜부터 다시 받아 덮어씁니다.
+        start_date = str(last_date) if last_date else (datetime.now() - timedelta(days=365*5)).strftime("%Y%m%d")
+        end_date = datetime.now().strftime("%Y%m%d")
+        rows = []; synced = False
+        try:
+            # KIS 일봉 조회는 1회 최대 100건이므로 최신 구간부터 거꾸로 나눠 받습니다.
+            while True:
+                params = {"FID_COND_MRKT_DIV_CODE": "J", "FID_INPUT_ISCD": stock_code, "FID_INPUT_DATE_1": start_date, "FID_INPUT_DATE_2": end_date, "FID_PERIOD_DIV_CODE": "D", "FID_ORG_ADJ_PRC": "1"}
+                data = await kis.get("/uapi/domestic-stock/v1/quotations/inquire-daily-itemchartprice", "FHKST03010100", params)
+                if data.get('rt_cd') != '0': print(f"⚠️ {stock_code} 일봉 조회 실패: {data.get('msg1')}"); break
+                page = [item for item in (data.get('output2') or []) if isinstance(item, dict) and item.get('stck_bsop_date')]
+                if not page: synced = True; break
+                rows.extend(page)
+                earliest = min(item['stck_bsop_date'] for item in page)
+                if earliest <= start_date or len(page) < KIS_DAILY_CANDLE_PAGE_SIZE: synced = True; break
+                end_date = (datetime.strptime(earliest, "%Y%m%d") - timedelta(days=1)).strftime("%Y%m%d")
+        except KISAPIError as e:
+            print(f"⚠️ {stock_code} 일봉 동기화 실패, 저장된 데이터로 응답합니다: {e}")
+        # 페이지는 최신 구간부터 받으므로, 중간에 실패하면 받은 봉과 저장된 봉 사이에 빈 구간이 생깁니다.
+        # 저장소는 뒤에 덧붙이기만 하므로 빈 구간을 나중에 채울 수 없어, 끝까지 받은 경우에만 저장하고 다음 동기화에서 다시 받습니다.
+        if rows and not synced: print(f"⚠️ {stock_code} 일봉 {len(rows)}건을 받던 중 중단되어 저장하지 않습니다.")
+        if rows and synced:
+            added = await candle_store.append(stock_code, {"date": [int(item['stck_bsop_date']) for item in rows], "open": [float(item.get('stck_oprc') or 0) for item in rows], "high": [float(item.get('stck_hgpr') or 0) for item in rows], "low": [float(item.get('stck_lwpr') or 0) for item in rows], "close": [float(item.get('stck_clpr') or 0) for item in rows], "volume": [float(item.get('acml_vol') or 0) for item in rows]})
+            print(f"🗂️ {stock_code} 일봉 {added}건 저장 (마지막 저장일: {candle_store.last_date(stock_code)})")
+        if synced: candle_synced_at[stock_code] = time.monotonic(); candle_sync_failed_at.pop(stock_code, None)
+        else: candle_sync_failed_at[stock_code] = time.monotonic()
+
+# 장 시작(09:00) 이후에 집계를 시작한 종목(서버 재시작, 늦은 구독)은 그 전 분봉이 메모리에 없으므로 KIS 분봉으로 채웁니다.
+MARKET_OPEN_OFFSET = 9 * 3600
+MINUTE_BACKFILL_TTL = float(os.getenv("MINUTE_BACKFILL_TTL", "600"))
+KIS_MINUTE_CANDLE_PAGE_SIZE = 30
+
+async def streaming_minute_bars(stock_code: str, bar_interval: str):
+    key = (STOCK_TICK_TR_ID, stock_code)
+    day_start = bar_aggregator.today_start_epoch()
+    bars = bar_aggregator.bars(key, bar_interval, since_epoch=day_start)
+    labels = [bar.start for bar in bars]
+    cols = {col: [getattr(bar, col) for bar in bars] for col in OHLCV_COLUMNS}
+    since = bar_aggregator.tracking_since(key)
+    if since is not None and since > day_start + MARKET_OPEN_OFFSET:
+        # 집계 시작 전 구간은 이미 확정된 봉이므로 집계 세션(since)마다 한 번만 받아 둡니다.
+        backfill = await quote_cache.get_or_fetch(("minute_backfill", stock_code, bar_interval, since), lambda: fetch_minute_backfill(stock_code, BAR_INTERVALS[bar_interval], since),
+                                                  MINUTE_BACKFILL_TTL, should_cache=lambda result: result["complete"])
+        cutoff = labels[0] if labels else float("inf")
+        earlier = [bar for bar in backfill["bars"] if bar["start"] < cutoff]
+        labels = [bar["start"] for bar in earlier] + labels
+        cols = {col: [bar[col] for bar in earlier] + values for col, values in cols.items()}
+    return labels, {col: np.array(values, dtype=np.float64) for col, values in cols.items()}
+
+async def fetch_minute_backfill(stock_code: str, interval_sec: int, until_epoch: int) -> dict:
+    """오늘 장 시작부터 until_epoch까지의 분봉을 interval_sec 단위 봉으로 묶어 돌려줍니다.
+    KIS 분봉 조회는 FID_INPUT_HOUR_1 시각까지의 1분봉을 최대 30건씩 주므로 최신 구간부터 거꾸로 나눠 받습니다."""
+    day_start = bar_aggregator.today_start_epoch()
+    today = datetime.fromtimestamp(day_start, KST).strftime("%Y%m%d")
+    hour = datetime.fromtimestamp(until_epoch, KST).strftime("%H%M%S")
+    minutes = {}; complete = False
     try:
-        res = requests.get(url, headers=headers, params=params, timeout=5); res.raise_for_status(); data = res.json()
+        while True:
+            params = {"FID_ETC_CLS_CODE": "", "FID_COND_MRKT_DIV_CODE": "J", "FID_INPUT_ISCD": stock_code, "FID_INPUT_HOUR_1": hour, "FID_PW_DATA_INCU_YN": "Y"}
+            data = await kis.get("/uapi/domestic-stock/v1/quotations/inquire-time-itemchartprice", "FHKST03010200", params)
+            if data.get('rt_cd') != '0': print(f"⚠️ {stock_code} 분봉 조회 실패: {data.get('msg1')}"); break
+            page = [item for item in (data.get('output2') or []) if isinstance(item, dict) and len(item.get('stck_cntg_hour') or '') == 6 and item.get('stck_bsop_date', today) == today]
+            for item in page:
+                time_str = item['stck_cntg_hour']
+                minutes[day_start + int(time_str[0:2]) * 3600 + int(time_str[2:4]) * 60] = item
+            earliest = min((item['stck_cntg_hour'] for item in page), default=None)
+            if earliest is None or earliest <= "090000" or len(page) < KIS_MINUTE_CANDLE_PAGE_SIZE: complete = True; break
+            if earliest >= hour: break  # 요청한 시각보다 이전 봉이 오지 않으면 더 받을 수 없습니다.
+            hour = (datetime.strptime(earliest, "%H%M%S") - timedelta(minutes=1)).strftime("%H%M%S")
+    except KISAPIError as e:
+        print(f"⚠️ {stock_code} 분봉 조회 실패: {e}")
+    bars = []
+    for epoch in sorted(minutes):
+        item = minutes[epoch]
+        start = epoch - epoch % interval_sec
+        price = {"open": float(item.get('stck_oprc') or 0), "high": float(item.get('stck_hgpr') or 0), "low": float(item.get('stck_lwpr') or 0), "close": float(item.get('stck_prpr') or 0), "volume": float(item.get('cntg_vol') or 0)}
+        if bars and bars[-1]["start"] == start:
+            bar = bars[-1]
+            bar["high"] = max(bar["high"], price["high"]); bar["low"] = min(bar["low"], price["low"]); bar["close"] = price["close"]; bar["volume"] += price["volume"]
+        else: bars.append({"start": start, **price})
+    # 일부 페이지만 받은 결과는 캐시하지 않고 다음 요청에서 다시 받습니다.
+    return {"bars": bars, "complete": complete}
+
+async def fetch_minute_candles(stock_code: str, interval: str):
+    params = {"FID_COND_MRKT_DIV_CODE": "J", "FID_INPUT_ISCD": stock_code, "FID_ETC_CLS_CODE": "", "FID_INPUT_DATE_1": "", "FID_INPUT_HOUR_1": "090000", "FID_INPUT_HOUR_2": "153000", "FID_PERIOD_DIV_CODE": interval}
+    try:
+        data = await kis.get("/uapi/domestic-stock/v1/quotations/inquire-time-itemchartprice", "FHKST03010200", params)
         if data.get('rt_cd') != '0' or not data.get('output1'): return []
         output = data['output1']
         if isinstance(output, dict): output = [output]
         chart_data = []
+        today = datetime.now().strftime("%Y-%m-%d")
         for item in reversed(output):
             if not isinstance(item, dict): continue
-            if period == "day": date_str, time_str, close_price = item.get('stck_bsop_date'), "000000", item.get('stck_clpr')
-            else: date_str, time_str, close_price = datetime.now().strftime("%Y%m%d"), item.get('stck_cntg_hour'), item.get('stck_prpr')
-            if not date_str: continue
-            dt_obj = datetime.strptime(f"{date_str}{time_str}", "%Y%m%d%H%M%S")
-            chart_data.append({"date": dt_obj.strftime("%Y-%m-%d %H:%M:%S"), "open": float(item.get('stck_oprc') or 0), "high": float(item.get('stck_hgpr') or 0), "low": float(item.get('stck_lwpr') or 0), "close": float(close_price or 0), "volume": float(item.get('cntg_vol') or item.get('acml_vol') or 0)})
+            time_str = item.get('stck_cntg_hour')
+            if not time_str: continue
+            chart_data.append({"date": f"{today} {time_str[0:2]}:{time_str[2:4]}:{time_str[4:6]}", "open": float(item.get('stck_oprc') or 0), "high": float(item.get('stck_hgpr') or 0), "low": float(item.get('stck_lwpr') or 0), "close": float(item.get('stck_prpr') or 0), "volume": float(item.get('cntg_vol') or item.get('acml_vol') or 0)})
         return chart_data
     except Exception as e: print(f"!!! /candles 엔드포인트에서 오류 발생: {e}"); return []
 
 @app.get("/market/indices", tags=["Stock Data"])
 async def get_market_indices():
     if not are_keys_configured(): return []
-    token = get_access_token()
-    url = f"{KIS_BASE_URL}/uapi/domestic-stock/v1/quotations/inquire-index-price"
-    headers = {"Authorization": f"Bearer {token}", "appkey": KIS_APP_KEY, "appsecret": KIS_APP_SECRET, "tr_id": "FHPUP02110000"}
-    results = []
-    for index_info in [{"name": "KOSPI", "code": "0001", "flag": "🇰🇷"}, {"name": "KOSDAQ", "code": "1001", "flag": "🇰🇷"}]:
-        params = {"FID_INPUT_ISCD": index_info["code"], "FID_COND_MRKT_DIV_CODE": "U"}
-        try:
-            res = requests.get(url, headers=headers, params=params, timeout=5); res.raise_for_status(); data = res.json()
-            if data.get('rt_cd') == '0':
-                output = data['output']
-                sign = -1 if output.get('prdy_vrss_sign') in ['4', '5'] else 1
-                results.append({"name": index_info["name"], "value": float(output.get('bstp_nmix_prpr', 0)), "change": float(output.get('prdy_vrss', 0)), "changePercent": float(output.get('prdy_ctrt', 0)) * sign, "flag": index_info["flag"]})
-            else: results.append({"name": index_info["name"], "value": 0, "change": 0, "changePercent": 0, "flag": index_info["flag"]})
-        except Exception: results.append({"name": index_info["name"], "value": 0, "change": 0, "changePercent": 0, "flag": index_info["flag"]})
-    return results
-
-# --- CSV 파일에서 과거 차트 데이터를 읽어오는 새로운 API 엔드포인트 ---
-@app.get("/stocks/{stock_code}/historical-candles", tags=["Stock Data"])
-async def get_historical_candles_from_csv(stock_code: str):
-    # 지금은 KODEX 200만 지원하지만, 향후 다른 종목도 지원하도록 확장 가능
-    if stock_code != "069500":
-        raise HTTPException(status_code=404, detail="해당 종목의 과거 데이터 파일이 없습니다.")
-
-    file_path = "data/kodex200.csv"
+    # 조회에 실패한 지수(value=0)가 섞인 결과는 캐시하지 않습니다.
+    return await quote_cache.get_or_fetch(("market_indices",), fetch_market_indices, QUOTE_TTL_MARKET_INDICES, should_cache=lambda results: all(r["value"] for r in results))
 
-    if not os.path.exists(file_path):
-        print(f"⚠️ 경고: {file_path}를 찾을 수 없습니다.")
-        return []
+async def fetch_market_indices():
+    # KOSPI, KOSDAQ 지수를 순차 호출하지 않고 동시에 조회합니다.
+    index_infos = [{"name": "KOSPI", "code": "0001", "flag": "🇰🇷"}, {"name": "KOSDAQ", "code": "1001", "flag": "🇰🇷"}]
+    return list(await asyncio.gather(*(fetch_index_price(index_info) for index_info in index_infos)))
 
+async def fetch_index_price(index_info: dict):
+    params = {"FID_INPUT_ISCD": index_info["code"], "FID_COND_MRKT_DIV_CODE": "U"}
     try:
-        # [수정 1] CSV 파일의 첫 번째 행을 헤더로 사용하지 않고, 직접 컬럼 이름을 지정합니다.
-        # 이렇게 하면 CSV 파일의 헤더 이름이 다르거나 없어도 정상적으로 작동합니다.
-        df = pd.read_csv(file_path, names=['date', 'open', 'high', 'low', 'close'], header=0)
-
-        # [수정 2] 데이터가 비어있는 행(NaN)이 있을 경우 제거합니다.
-        df.dropna(inplace=True)
-
-        # [수정 3] 각 컬럼의 데이터 타입을 숫자로 변환합니다. 오류 발생 시 해당 행을 무시합니다.
-        for col in ['open', 'high', 'low', 'close']:
-            df[col] = pd.to_numeric(df[col], errors='coerce')
-        df.dropna(inplace=True)
-
-        # 데이터를 프론트엔드가 요구하는 JSON 형식으로 변환
-        chart_data = df.to_dict('records')
-
-        # 날짜 형식을 프론트엔드 차트와 일치시키기
-        for item in chart_data:
-            try:
-                dt_obj = pd.to_datetime(item['date'])
-                item['date'] = dt_obj.strftime("%Y-%m-%d")
-            except Exception as date_err:
-                print(f"날짜 변환 오류: {item['date']} -> {date_err}")
-                item['date'] = "Invalid Date" # 잘못된 날짜는 표시
-
-        # 유효하지 않은 날짜 데이터 필터링
-        chart_data = [item for item in chart_data if item['date'] != "Invalid Date"]
-
-        print(f"✅ {file_path}에서 {len(chart_data)}개의 과거 데이터를 성공적으로 로드했습니다.")
-        return chart_data
-
+        data = await kis.get("/uapi/domestic-stock/v1/quotations/inquire-index-price", "FHPUP02110000", params)
+        if data.get('rt_cd') == '0':
+            output = data['output']
+            sign = -1 if output.get('prdy_vrss_sign') in ['4', '5'] else 1
+            return {"name": index_info["name"], "value": float(output.get('bstp_nmix_prpr', 0)), "change": float(output.get('prdy_vrss', 0)), "changePercent": float(output.get('prdy_ctrt', 0)) * sign, "flag": index_info["flag"]}
+    except Exception as e: print(f"⚠️ {index_info['name']} 지수 조회 실패: {e}")
+    return {"name": index_info["name"], "value": 0, "change": 0, "changePercent": 0, "flag": index_info["flag"]}
+
+# --- CSV 파일에서 과거 차트 데이터를 읽어오는 API 엔드포인트 ---
+# data/history/{종목코드}.csv 는 처음 요청 시 컬럼 캐시로 변환되고, 이후 요청은 캐시에서 구간만 잘라 응답합니다.
+@app.get("/stocks/{stock_code}/historical-candles", tags=["Stock Data"])
+async def get_historical_candles_from_csv(request: Request, stock_code: str, start: str | None = None, end: str | None = None, columns: str = "open,high,low,close",
+                                          format: str = "records", max_points: int | None = None, downsample: str = "ohlc"):
+    # format=columnar는 columns와 상관없이 OHLC와 거래량을 모두 돌려줍니다.
+    check_chart_params(format, max_points, downsample)
+    try:
+        start_int, end_int = to_date_int(start, 0), to_date_int(end, 99991231)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    selected = tuple(col.strip() for col in columns.split(",") if col.strip())
+    invalid = [col for col in selected if col not in PRICE_COLUMNS]
+    if invalid or not selected:
+        raise HTTPException(status_code=400, detail=f"columns는 {', '.join(PRICE_COLUMNS)} 중에서 선택해야 합니다.")
+    try:
+        labels, values = await historical_store.query(stock_code, start_int, end_int, PRICE_COLUMNS if format == "columnar" or max_points else selected)
+    except HistoryNotFound:
+        raise HTTPException(status_code=404, detail="해당 종목의 과거 데이터 파일이 없습니다.")
     except Exception as e:
-        # [수정 4] 오류 발생 시, 어떤 종류의 오류인지 터미널에 상세하게 출력합니다.
         print(f"!!! /historical-candles CSV 처리 중 심각한 오류 발생: {type(e).__name__}, {e}")
         raise HTTPException(status_code=500, detail=f"CSV 파일 처리 중 오류 발생: {e}")
+    if format == "records" and not max_points: return records_payload(labels, values, selected)
+    return await chart_response(labels, values, request=request, format=format, max_points=max_points, downsample_mode=downsample, fields=selected)
+
+# --- 기록된 시세 스냅샷 조회 ---
+@app.get("/stocks/{stock_code}/snapshots", tags=["Stock Data"])
+async def get_stock_snapshots(stock_code: str, start: str | None = None, end: str | None = None):
+    # 날짜를 생략하면 오늘 기록만 돌려줍니다. 파일을 청크 단위로 읽어 그대로 흘려보냅니다.
+    if not stock_code.isalnum(): raise HTTPException(status_code=400, detail="잘못된 종목 코드입니다.")
+    today = int(datetime.now(KST).strftime("%Y%m%d"))
+    try:
+        start_int = to_date_int(start, today); end_int = to_date_int(end, max(start_int, today))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # 아직 버퍼에 남아 있는 행까지 포함되도록 먼저 기록합니다.
+    await snapshot_recorder.flush()
+    return StreamingResponse(snapshot_recorder.iter_csv(stock_code, start_int, end_int), media_type="text/csv")
+
+# --- 보조지표 (SMA/EMA/RSI/MACD/볼린저밴드) ---
+# 확정된 봉은 메모된 지표에 이어 붙이고, 진행 중인 봉(오늘 일봉, 현재 분봉)의 값은 요청 시점에 O(1)로 계산합니다.
+MAX_INDICATORS_PER_REQUEST = 10
+indicator_engine = IndicatorEngine()
+
+def format_day_label(d: int) -> str: return f"{d // 10000:04d}-{d // 100 % 100:02d}-{d % 100:02d} 00:00:00"
+def format_history_label(d: int) -> str: return f"{d // 10000:04d}-{d // 100 % 100:02d}-{d % 100:02d}"
+def format_bar_label(epoch: int) -> str: return datetime.fromtimestamp(epoch, KST).strftime("%Y-%m-%d %H:%M:%S")
+
+@app.get("/stocks/{stock_code}/indicators", tags=["Stock Data"])
+async def get_stock_indicators(stock_code: str, indicators: str = "sma:20,sma:60", period: str = "day", interval: str = "1", start: str | None = None, end: str | None = None):
+    try:
+        specs = list(dict.fromkeys(spec_key(*parse_spec(spec)) for spec in indicators.split(",") if spec.strip()))
+        start_label, end_label = to_date_int(start, 0), to_date_int(end, 99991231)
+    except ValueError as e: raise HTTPException(status_code=400, detail=str(e))
+    if not specs or len(specs) > MAX_INDICATORS_PER_REQUEST:
+        raise HTTPException(status_code=400, detail=f"indicators는 1~{MAX_INDICATORS_PER_REQUEST}개를 지정해야 합니다.")
+    live = None
+    if period == "minute":
+        # 분봉 지표는 틱으로 집계 중인 종목만 제공합니다(오늘 봉 기준, 분봉 차트와 같은 범위).
+        bar_interval = {"1": "1m", "5": "5m", "60": "1h"}.get(interval)
+        key = (STOCK_TICK_TR_ID, stock_code)
+        if not bar_interval or not is_streaming(key):
+            raise HTTPException(status_code=404, detail="실시간 구독 중인 종목만 분봉 지표를 제공합니다.")
+        bars = bar_aggregator.bars(key, bar_interval, include_current=False)
+        labels, close = [bar.start for bar in bars], np.array([bar.close for bar in bars], dtype=np.float64)
+        current = bar_aggregator.current_bar(key, bar_interval)
+        if current is not None: live = (current.start, current.close)
+        series_key, format_label = ("bars", key, bar_interval), format_bar_label
+        start_label, end_label = bar_aggregator.today_start_epoch(), float("inf")
+    elif period == "day":
+        if not are_keys_configured(): return {"code": stock_code, "period": period, "interval": interval, "dates": [], "indicators": {}}
+        candle_period = {"1": "D", "7": "W", "30": "M"}.get(interval, "D")
+        await sync_daily_candles(stock_code)
+        # 지표 초기 구간을 위해 저장된 전체 일봉으로 계산하고, 응답만 start~end로 자릅니다. 마지막 봉은 장중에 바뀔 수 있으므로 진행 중인 봉으로 다룹니다.
+        full = aggregate_candles(await candle_store.range(stock_code, 0, 99991231), candle_period)
+        labels, close = full["date"].tolist(), full["close"]
+        if labels: live = (labels.pop(), float(close[-1])); close = close[:-1]
+        series_key, format_label = ("day", stock_code, candle_period), format_day_label
+    elif period == "history":
+        try: history = await historical_store.load(stock_code)
+        except HistoryNotFound: raise HTTPException(status_code=404, detail="해당 종목의 과거 데이터 파일이 없습니다.")
+        labels, close = history.columns["date"].tolist(), history.columns["close"]
+        series_key, format_label = ("history", stock_code, history.source_mtime), format_history_label
+    else: raise HTTPException(status_code=400, detail="Invalid period specified.")
+
+    lo, hi = slice_range(labels, start_label, end_label)
+    with_live = live is not None and start_label <= live[0] <= end_label
+    result = {}
+    for spec in specs:
+        series = indicator_engine.series(series_key, spec, labels, close)
+        if period == "minute": series.trim(BAR_CAPACITY[bar_interval])
+        # 메모가 잘린 경우(분봉)에도 같은 날짜 구간을 맞추기 위해 끝에서부터 자릅니다.
+        offset = len(series.labels) - len(labels)
+        live_values = series.live(live[1]) if with_live else {}
+        outputs = {out: values[lo + offset:hi + offset] + ([live_values[out]] if with_live else []) for out, values in series.values.items()}
+        result[spec] = next(iter(outputs.values())) if len(outputs) == 1 else outputs
+    dates = [format_label(label) for label in labels[lo:hi]] + ([format_label(live[0])] if with_live else [])
+    return {"code": stock_code, "period": period, "interval": interval, "dates": dates, "indicators": result}
+
+# --- 캐시 모니터링 엔드포인트 ---
+@app.get("/metrics/cache", tags=["Monitoring"])
+async def get_cache_metrics():
+    # hit/miss/coalesced 카운터로 TTL 값을 조정할 때 참고합니다.
+    return quote_cache.snapshot_stats()
+
+@app.get("/metrics/realtime", tags=["Monitoring"])
+async def get_realtime_metrics():
+    # 클라이언트 송신 큐 깊이, 병합/버림/강제 해제 횟수를 함께 제공합니다.
+    return {"hub": tick_hub.snapshot_stats(), "stockUpdates": manager.snapshot_stats(), "kospi200": kospi200_manager.snapshot_stats(),
+            "snapshots": snapshot_recorder.snapshot_stats()}
+
+@app.get("/metrics/credentials", tags=["Monitoring"])
+async def get_credential_metrics():
+    # 발급 대기 시간과, 메모리/파일 값으로 재발급을 피한 횟수를 제공합니다.
+    return credentials.snapshot_stats()
 
 # --- AI Predict 엔드포인트 ---
+# .env 파일에서 VM 주소 불러오기
+AI_VM_URL = os.getenv("AI_VM_URL")
+predictor = PredictorGateway(AI_VM_URL) if AI_VM_URL else None
+
 @app.post("/ai/predict/{stock_code}", tags=["AI Service"])
 async def ai_predict(stock_code: str, last_close: float):
-    # .env 파일에서 VM 주소 불러오기
-    ai_vm_url = os.getenv("AI_VM_URL")
-
     # VM 주소가 설정되어 있지 않으면, 기존의 시뮬레이션 로직을 실행
-    if not ai_vm_url:
+    if predictor is None:
         print("⚠️ AI VM 주소가 설정되지 않아 내부 시뮬레이션을 실행합니다.")
         await asyncio.sleep(1)
         predicted_min = last_close * 0.99; predicted_max = last_close * 1.02
         return {"range": [predicted_min, predicted_max], "analysis": "...", "reason": "...", "positiveFactors": [], "potentialRisks": []}
 
-    # VM으로 보낼 요청 URL과 데이터
-    vm_predict_url = f"{ai_vm_url}/predict"
-    request_data = {"stock_code": stock_code, "last_close": last_close}
-
-    print(f"🚀 AI VM({vm_predict_url})으로 예측 요청을 전달합니다...")
+    # 동시에 들어온 요청은 게이트웨이에서 모아 VM에 한 번에 전달하고, 같은 종목의 당일 예측은 캐시에서 돌려줍니다.
     try:
-        # VM에 POST 요청 보내기
-        res = requests.post(vm_predict_url, json=request_data, timeout=10) # 타임아웃 10초
-        res.raise_for_status() # HTTP 오류 발생 시 예외 발생
-
-        # VM으로부터 받은 응답을 그대로 프론트엔드에 반환
-        prediction_from_vm = res.json()
-        print("✅ AI VM으로부터 예측 결과를 수신했습니다.")
-        return prediction_from_vm
-
-    except requests.exceptions.RequestException as e:
-        print(f"!!! AI VM 연결 실패: {e}")
+        return await predictor.predict(stock_code, last_close)
+    except PredictorBusy:
+        raise HTTPException(status_code=429, detail="AI 예측 요청이 많습니다. 잠시 후 다시 시도해주세요.", headers={"Retry-After": "5"})
+    except PredictorUnavailable:
         raise HTTPException(status_code=503, detail="AI 예측 서버에 연결할 수 없습니다.")
 
+@app.get("/metrics/ai", tags=["Monitoring"])
+async def get_ai_metrics():
+    return predictor.snapshot_stats() if predictor is not None else {}
+
 # --- 웹소켓 엔드포인트 ---
 @app.websocket("/ws/kospi200")
 async def websocket_kospi200_endpoint(websocket: WebSocket):
     origin = websocket.headers.get('origin', '').rstrip('/');
     if origin not in origins: await websocket.close(code=1008); return
-    await websocket.accept()
-    if not are_keys_configured(): await websocket.send_json({"error": "KIS API keys not configured on server."}); await websocket.close(code=1011); return
-    while True:
-        try:
-            approval_key = get_approval_key()
-            async with websockets.connect(KIS_WS_URL, ping_interval=None) as ws:
-                subscribe_msg = {"header": {"approval_key": approval_key, "custtype": "P", "tr_type": "1"}, "body": {"input": {"tr_id": "H0UPANC0", "tr_key": "2001"}}}
-                await ws.send(json.dumps(subscribe_msg))
-                print(f"📡 KIS 웹소켓 구독 시작 (KOSPI200 Index): {origin}")
-                while True:
-                    msg = await ws.recv()
-                    if 'PINGPONG' not in msg: await websocket.send_text(msg)
-        except WebSocketDisconnect: print(f"❌ 클라이언트 WebSocket 연결 종료: {origin}"); break
-        except Exception as e: print(f"⚠️ KIS 웹소켓 오류 발생, 5초 후 재연결: {e}"); await asyncio.sleep(5)
+    if not are_keys_configured(): await websocket.accept(); await websocket.send_json({"error": "KIS API keys not configured on server."}); await websocket.close(code=1011); return
+    # connect가 허브 구독에서 실패해도 등록된 채널이 정리되도록 try 안에서 연결합니다.
+    try:
+        await kospi200_manager.connect(websocket, [(INDEX_TICK_TR_ID, KOSPI200_INDEX_CODE)])
+        print(f"📡 KOSPI200 지수 실시간 구독 시작: {origin}")
+        while True: await websocket.receive_text()
+    except HubCapacityError as e: await websocket.send_json({"error": str(e)}); await websocket.close(code=1011)
+    except WebSocketDisconnect: print(f"❌ 클라이언트 WebSocket 연결 종료: {origin}")
+    finally: await kospi200_manager.disconnect(websocket)
 
 # --- 백그라운드 데이터 수신을 위한 새 웹소켓 엔드포인트 ---
+def parse_subscription_request(request: dict):
+    # {"action": "subscribe", "symbols": ["005930"], "indices": ["0001"], "format": "raw" | "msgpack" | "delta", "fields": ["price", ...]}
+    symbols = [code for code in request.get("symbols", []) if isinstance(code, str) and len(code) == 6 and code.isalnum()]
+    indices = [code for code in request.get("indices", []) if isinstance(code, str) and len(code) == 4 and code.isdigit()]
+    return [(STOCK_TICK_TR_ID, code) for code in symbols] + [(INDEX_TICK_TR_ID, code) for code in indices]
+
 @app.websocket("/ws/stock-updates")
 async def websocket_stock_updates_endpoint(websocket: WebSocket):
-    await manager.connect(websocket)
-    print(f"✅ 클라이언트가 실시간 업데이트에 연결되었습니다: {websocket.client.host}")
+    default_subscriptions = [(STOCK_TICK_TR_ID, DEFAULT_STREAM_CODE)] if are_keys_configured() else []
     try:
-        while True: await websocket.receive_text()
+        await manager.connect(websocket, default_subscriptions)
+        print(f"✅ 클라이언트가 실시간 업데이트에 연결되었습니다: {websocket.client.host}")
+        while True:
+            try: request = json.loads(await websocket.receive_text())
+            except json.JSONDecodeError: continue
+            if not isinstance(request, dict) or request.get("action") not in ("subscribe", "unsubscribe"): continue
+            keys = parse_subscription_request(request)
+            try:
+                if request["action"] == "subscribe":
+                    if not are_keys_configured(): raise HubCapacityError("KIS API keys not configured on server.")
+                    if "format" in request or "fields" in request: manager.set_encoding(websocket, request.get("format", "raw"), request.get("fields"))
+                    await manager.subscribe(websocket, keys)
+                else: await manager.unsubscribe(websocket, keys)
+            except (HubCapacityError, ValueError) as e:
+                manager.send_personal(websocket, json.dumps({"type": "error", "message": str(e)})); continue
+            # 구독을 기다리는 동안 연결이 정리되었다면 응답을 보내지 않습니다.
+            channel = manager.channels.get(websocket)
+            if channel is None: continue
+            current = manager.active_connections.get(websocket, set()); encoder = channel.encoder
+            manager.send_personal(websocket, json.dumps({"type": "subscriptions", "symbols": sorted(k for t, k in current if t == STOCK_TICK_TR_ID), "indices": sorted(k for t, k in current if t == INDEX_TICK_TR_ID), "format": encoder.format, "fields": list(encoder.fields)}))
+    except HubCapacityError as e:
+        await websocket.send_json({"type": "error", "message": str(e)}); await websocket.close(code=1011)
     except WebSocketDisconnect:
-        manager.disconnect(websocket)
         print(f"❌ 클라이언트가 실시간 업데이트에서 연결 해제되었습니다: {websocket.client.host}")
+    finally: await manager.disconnect(websocket)
 
 # --- 백그라운드 작업 ---
-async def background_kis_websocket_client():
-    stock_code = "069500" # KODEX 200
-    while True:
-        if not are_keys_configured(): await asyncio.sleep(60); continue
-        try:
-            approval_key = get_approval_key()
-            async with websockets.connect(KIS_WS_URL, ping_interval=20) as ws:
-                print(f"📡 [BG] KIS WebSocket 서버에 연결되었습니다. ({stock_code})")
-                subscribe_msg = {"header": {"approval_key": approval_key, "custtype": "P", "tr_type": "1"}, "body": {"input": {"tr_id": "H0STCNT0", "tr_key": stock_code}}}
-                await ws.send(json.dumps(subscribe_msg))
-                print(f"📡 [BG] 구독 메시지 전송: {stock_code}")
-                while True:
-                    msg = await ws.recv()
-                    await manager.broadcast(json.dumps({"type": "tick", "data": msg}))
-        except Exception as e:
-            print(f"⚠️ [BG] KIS WebSocket 오류, 30초 후 재시도: {e}")
-            await asyncio.sleep(30)
-
-async def background_fetch_price_periodically():
-    stock_code = "069500" # KODEX 200
-    print(f"📈 [5분 주기] {stock_code} 현재가 조회를 시작합니다.")
+# 이벤트 루프는 태스크를 약한 참조로만 들고 있으므로 종료 시까지 여기서 참조를 유지합니다.
+background_tasks: set[asyncio.Task] = set()
+
+async def background_flush_bars():
+    # 틱이 뜸한 종목도 봉 종료 시각이 지나면 확정해서 클라이언트에 보냅니다.
     while True:
-        await asyncio.sleep(300)
-        if are_keys_configured():
-            price_data = get_current_price(stock_code)
-            if price_data:
-                simplified_data = {"stck_prpr": price_data.get("stck_prpr"), "prdy_vrss": price_data.get("prdy_vrss"), "prdy_ctrt": price_data.get("prdy_ctrt"), "stck_bsop_date": price_data.get("stck_bsop_date")}
-                await manager.broadcast(json.dumps({"type": "snapshot_5min", "data": simplified_data}))
-                save_snapshot_to_csv(simplified_data)
-                print(f"📈 [5분 주기] 데이터 전송 및 저장: {simplified_data}")
+        await asyncio.sleep(1)
+        for key, interval, bar in bar_aggregator.flush_expired(time.time()): on_bar_finalized(key, interval, bar)
 
 
 # --- 서버 시작 이벤트 ---
 @app.on_event("startup")
 async def startup_event():
     print("■■■■■■■■■■■■■■■■■■■■\n■ FastAPI 서버가 시작되었습니다.\n■■■■■■■■■■■■■■■■■■■■")
+    snapshot_recorder.start()
     if are_keys_configured():
         print("✅ KIS API 키가 감지되었습니다. API 연동을 시도합니다.")
-        try: get_access_token() # get_approval_key는 필요할 때만 호출
+        try: await credentials.access_token() # Approval Key는 실시간 연결 시에 발급
         except Exception as e: print(f"초기 KIS 인증 실패: {e}")
-        asyncio.create_task(background_kis_websocket_client())
-        asyncio.create_task(background_fetch_price_periodically())
-    else: print("⚠️ 경고: KIS API 키가 .env 파일에 설정되지 않았습니다. 예시 데이터로 작동합니다.")
\ No newline at end of file
+        credentials.start()
+        # 기본 종목은 접속한 클라이언트가 없어도 시세 캐시 갱신을 위해 계속 구독합니다.
+        await tick_hub.subscribe(STOCK_TICK_TR_ID, DEFAULT_STREAM_CODE)
+        background_tasks.add(asyncio.create_task(background_flush_bars()))
+    else: print("⚠️ 경고: KIS API 키가 .env 파일에 설정되지 않았습니다. 예시 데이터로 작동합니다.")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    for task in background_tasks: task.cancel()
+    await tick_hub.stop()
+    await snapshot_recorder.stop()
+    await credentials.stop()
+    if predictor is not None: await predictor.close()
+    await kis.close()
\ No newline at end of file
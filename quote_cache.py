@@ -0,0 +1,68 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+
+# --- 시세 캐시 (TTL + LRU, single-flight) ---
+# 같은 키에 대한 동시 캐시 미스는 하나의 업스트림 호출을 함께 기다립니다.
+
+QUOTE_CACHE_MAX_ENTRIES = int(os.getenv("QUOTE_CACHE_MAX_ENTRIES", "1024"))
+
+
+class QuoteCache:
+    def __init__(self, max_entries: int = QUOTE_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        # key -> (만료 시각, 값). 가장 오래 사용되지 않은 항목이 앞쪽에 위치합니다.
+        self.entries: OrderedDict[tuple, tuple[float, object]] = OrderedDict()
+        self.inflight: dict[tuple, asyncio.Task] = {}
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "evictions": 0, "expired": 0, "tick_updates": 0}
+
+    def get(self, key: tuple):
+        entry = self.entries.get(key)
+        if entry is None: return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self.entries[key]; self.stats["expired"] += 1; return None
+        self.entries.move_to_end(key)
+        return value
+
+    def set(self, key: tuple, value, ttl: float):
+        self.entries[key] = (time.monotonic() + ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False); self.stats["evictions"] += 1
+
+    def update(self, key: tuple, updater, ttl: float) -> bool:
+        """이미 캐시된 항목만 갱신합니다. (실시간 체결 데이터 반영용)"""
+        value = self.get(key)
+        if value is None: return False
+        self.set(key, updater(value), ttl)
+        self.stats["tick_updates"] += 1
+        return True
+
+    async def get_or_fetch(self, key: tuple, fetch, ttl: float, should_cache=None):
+        value = self.get(key)
+        if value is not None:
+            self.stats["hits"] += 1; return value
+        task = self.inflight.get(key)
+        if task is not None:
+            self.stats["coalesced"] += 1
+        else:
+            self.stats["misses"] += 1
+            task = asyncio.ensure_future(self._fetch_and_store(key, fetch, ttl, should_cache))
+            self.inflight[key] = task
+        # 요청한 클라이언트가 끊겨도 다른 대기자를 위해 업스트림 호출은 계속 진행합니다.
+        return await asyncio.shield(task)
+
+    async def _fetch_and_store(self, key: tuple, fetch, ttl: float, should_cache):
+        try:
+            value = await fetch()
+            if should_cache is None or should_cache(value): self.set(key, value, ttl)
+            return value
+        finally:
+            self.inflight.pop(key, None)
+
+    def snapshot_stats(self) -> dict:
+        lookups = self.stats["hits"] + self.stats["misses"] + self.stats["coalesced"]
+        return {**self.stats, "entries": len(self.entries), "inflight": len(self.inflight),
+                "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0.0}
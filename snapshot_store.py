@@ -0,0 +1,215 @@
+import asyncio
+import os
+import time
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from tick_codec import Tick
+
+# --- 시세 스냅샷 기록기 ---
+# 틱/스냅샷을 메모리 버퍼에 모아 두었다가 백그라운드에서 일괄 기록합니다(write-behind).
+# 파일은 data/snapshots/{YYYYMMDD}/{종목코드}.csv 로 나뉘고, 크기가 커지면 {종목코드}.1.csv, .2.csv ... 로 넘어갑니다.
+# 이벤트 루프에서는 버퍼에 튜플을 추가하기만 하고, 문자열 변환과 파일 쓰기는 스레드에서 합니다.
+
+KST = ZoneInfo("Asia/Seoul")
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "data/snapshots")
+SNAPSHOT_FLUSH_INTERVAL = float(os.getenv("SNAPSHOT_FLUSH_INTERVAL", "1"))
+SNAPSHOT_BATCH_SIZE = int(os.getenv("SNAPSHOT_BATCH_SIZE", "5000"))  # 버퍼가 이만큼 차면 주기를 기다리지 않고 기록
+SNAPSHOT_MAX_BUFFER = int(os.getenv("SNAPSHOT_MAX_BUFFER", "200000"))  # 디스크가 밀릴 때 버퍼 상한 (초과분은 오래된 것부터 버림)
+# fsync 정책: "batch"(기록할 때마다), "interval"(SNAPSHOT_FSYNC_INTERVAL초마다), "never"(OS에 맡김)
+SNAPSHOT_FSYNC = os.getenv("SNAPSHOT_FSYNC", "interval")
+SNAPSHOT_FSYNC_INTERVAL = float(os.getenv("SNAPSHOT_FSYNC_INTERVAL", "5"))
+SNAPSHOT_ROTATE_BYTES = int(os.getenv("SNAPSHOT_ROTATE_BYTES", str(64 * 1024 * 1024)))
+# 실시간 구독 한도(KIS_WS_MAX_CONNECTIONS x KIS_WS_MAX_SUBSCRIPTIONS)보다 커야 파일을 반복해서 여닫지 않습니다.
+SNAPSHOT_MAX_OPEN_FILES = int(os.getenv("SNAPSHOT_MAX_OPEN_FILES", "512"))
+
+SNAPSHOT_HEADER = "timestamp,code,kind,time,price,change,change_rate,volume,acc_volume\n"
+SNAPSHOT_FSYNC_POLICIES = ("batch", "interval", "never")
+
+
+def _number(value) -> str:
+    if value is None: return ""
+    return str(int(value)) if isinstance(value, float) and value.is_integer() else str(value)
+
+
+def part_files(day_dir: str, stock_code: str) -> list[str]:
+    """하루치 파일 목록을 기록 순서(.csv, .1.csv, .2.csv ...)대로 돌려줍니다."""
+    if not os.path.isdir(day_dir): return []
+    parts = []
+    for name in os.listdir(day_dir):
+        if not name.startswith(stock_code + ".") or not name.endswith(".csv"): continue
+        middle = name[len(stock_code) + 1:-4]
+        if middle == "": parts.append((0, name))
+        elif middle.isdigit(): parts.append((int(middle), name))
+    return [os.path.join(day_dir, name) for _, name in sorted(parts)]
+
+
+class PartitionWriter:
+    # (날짜, 종목) 파티션 하나의 현재 파일. 기록 스레드에서만 사용합니다.
+    def __init__(self, day_dir: str, stock_code: str):
+        self.day_dir = day_dir
+        self.stock_code = stock_code
+        existing = part_files(day_dir, stock_code)
+        self.part = len(existing) - 1 if existing else 0
+        self.file = None
+        self.size = 0
+        self.dirty = False
+
+    def path(self) -> str:
+        name = f"{self.stock_code}.csv" if self.part == 0 else f"{self.stock_code}.{self.part}.csv"
+        return os.path.join(self.day_dir, name)
+
+    def write(self, text: str):
+        if self.file is None:
+            os.makedirs(self.day_dir, exist_ok=True)
+            self.file = open(self.path(), "a", encoding="utf-8", newline="")
+            self.size = self.file.tell()
+            if self.size == 0: self.size += self.file.write(SNAPSHOT_HEADER)
+        if self.size >= SNAPSHOT_ROTATE_BYTES:
+            self.close(); self.part += 1
+            return self.write(text)
+        self.size += self.file.write(text)
+        self.dirty = True
+
+    def sync(self):
+        if self.file is None or not self.dirty: return False
+        self.file.flush(); os.fsync(self.file.fileno()); self.dirty = False
+        return True
+
+    def close(self):
+        if self.file is None: return
+        self.file.close(); self.file = None
+
+
+class SnapshotRecorder:
+    def __init__(self, root_dir: str = SNAPSHOT_DIR, flush_interval: float = SNAPSHOT_FLUSH_INTERVAL, batch_size: int = SNAPSHOT_BATCH_SIZE,
+                 max_buffer: int = SNAPSHOT_MAX_BUFFER, fsync: str = SNAPSHOT_FSYNC, fsync_interval: float = SNAPSHOT_FSYNC_INTERVAL):
+        if fsync not in SNAPSHOT_FSYNC_POLICIES: raise ValueError(f"지원하지 않는 fsync 정책: {fsync}")
+        self.root_dir = root_dir
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_buffer = max_buffer
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        # (epoch, 코드, 종류, 체결시각, 가격, 대비, 등락률, 거래량, 누적거래량)
+        self.buffer: list[tuple] = []
+        self.writers: dict[tuple[str, str], PartitionWriter] = {}  # 최근에 쓴 순서 유지 (dict 삽입 순서)
+        self.last_fsync = time.monotonic()
+        self.wakeup = asyncio.Event()
+        self.flush_lock = asyncio.Lock()
+        self.task: asyncio.Task | None = None
+        self.stats = {"recorded": 0, "written": 0, "batches": 0, "dropped": 0, "fsyncs": 0, "rotations": 0, "errors": 0}
+
+    # --- 이벤트 루프 쪽 (버퍼에 추가만 합니다) ---
+    def record(self, code: str, kind: str, hhmmss: str, price: float, change: float, change_rate: float, volume: float, acc_volume: float | None = None):
+        self.buffer.append((time.time(), code, kind, hhmmss, price, change, change_rate, volume, acc_volume))
+        self.stats["recorded"] += 1
+        if len(self.buffer) >= self.batch_size: self.wakeup.set()
+        if len(self.buffer) > self.max_buffer:
+            # 한 건씩 지우면 매번 리스트를 당겨야 하므로 batch_size만큼 여유를 두고 한 번에 버립니다.
+            overflow = len(self.buffer) - self.max_buffer + self.batch_size
+            del self.buffer[:overflow]; self.stats["dropped"] += overflow
+
+    def record_tick(self, tick: Tick):
+        self.record(tick.code, "tick", tick.time, tick.price, tick.change, tick.changeRate, tick.volume, tick.accVolume)
+
+    def start(self):
+        if self.task is None: self.task = asyncio.create_task(self.run())
+
+    async def run(self):
+        while True:
+            try: await asyncio.wait_for(self.wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError: pass
+            self.wakeup.clear()
+            # stop()에서 취소되더라도 진행 중인 기록 스레드가 끝날 때까지 락을 유지하도록 shield로 감쌉니다.
+            try: await asyncio.shield(self.flush())
+            except Exception as e:
+                self.stats["errors"] += 1; print(f"⚠️ 스냅샷 기록 실패: {e}")
+
+    async def flush(self):
+        async with self.flush_lock:
+            batch, self.buffer = self.buffer, []
+            # 쌓인 행이 없어도 interval 정책의 fsync는 제때 하도록 스레드에서 처리합니다.
+            if batch or (self.fsync == "interval" and self.writers):
+                await asyncio.to_thread(self._write_batch, batch)
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try: await self.task
+            except asyncio.CancelledError: pass
+            self.task = None
+        await self.flush()
+        await asyncio.to_thread(self._close_all)
+
+    # --- 기록 스레드 쪽 ---
+    def _writer_for(self, day: str, code: str) -> PartitionWriter:
+        key = (day, code)
+        writer = self.writers.pop(key, None)
+        if writer is None:
+            writer = PartitionWriter(os.path.join(self.root_dir, day), code)
+            # 열린 파일이 너무 많으면 가장 오래 쓰지 않은 파일부터 닫습니다(지난 날짜 파일도 여기서 정리됨).
+            while len(self.writers) >= SNAPSHOT_MAX_OPEN_FILES:
+                oldest = next(iter(self.writers)); self._retire(self.writers.pop(oldest))
+        self.writers[key] = writer
+        return writer
+
+    def _retire(self, writer: PartitionWriter):
+        if self.fsync != "never" and writer.sync(): self.stats["fsyncs"] += 1
+        writer.close()
+
+    def _write_batch(self, batch: list[tuple]):
+        # (날짜, 종목)별로 CSV 문자열을 모아 파일마다 write 한 번으로 씁니다.
+        groups: dict[tuple[str, str], list[str]] = {}
+        day_start, day_end, day, day_prefix = 0.0, 0.0, "", ""
+        for ts, code, kind, hhmmss, price, change, rate, volume, acc_volume in batch:
+            if not day_start <= ts < day_end:
+                # 날짜가 바뀔 때만 datetime을 계산하고, 나머지는 자정 기준 오프셋으로 시각 문자열을 만듭니다.
+                dt = datetime.fromtimestamp(ts, KST)
+                midnight = dt.replace(hour=0, minute=0, second=0, microsecond=0)
+                day_start = midnight.timestamp(); day_end = day_start + 86400
+                day = midnight.strftime("%Y%m%d"); day_prefix = midnight.strftime("%Y-%m-%dT")
+            offset = ts - day_start
+            seconds = int(offset)
+            stamp = f"{day_prefix}{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}.{int((offset - seconds) * 1000):03d}"
+            line = f"{stamp},{code},{kind},{hhmmss},{_number(price)},{_number(change)},{_number(rate)},{_number(volume)},{_number(acc_volume)}\n"
+            lines = groups.get((day, code))
+            if lines is None: groups[(day, code)] = [line]
+            else: lines.append(line)
+        for (day, code), lines in groups.items():
+            writer = self._writer_for(day, code)
+            part = writer.part
+            writer.write("".join(lines))
+            if writer.part != part: self.stats["rotations"] += 1
+            if self.fsync == "batch": writer.sync()
+            else: writer.file.flush()  # 조회 엔드포인트가 바로 읽을 수 있도록 OS 버퍼까지는 내려 둡니다.
+        if self.fsync == "batch": self.stats["fsyncs"] += len(groups)
+        elif self.fsync == "interval" and time.monotonic() - self.last_fsync >= self.fsync_interval:
+            self.stats["fsyncs"] += sum(1 for writer in self.writers.values() if writer.sync())
+            self.last_fsync = time.monotonic()
+        self.stats["written"] += len(batch); self.stats["batches"] += 1 if batch else 0
+
+    def _close_all(self):
+        for writer in self.writers.values(): self._retire(writer)
+        self.writers.clear()
+
+    # --- 조회 ---
+    def iter_csv(self, stock_code: str, start: int, end: int, chunk_size: int = 64 * 1024):
+        """[start, end] 날짜(YYYYMMDD) 구간의 기록을 CSV 청크로 돌려줍니다. 파일 전체를 메모리에 올리지 않습니다."""
+        yield SNAPSHOT_HEADER
+        if not os.path.isdir(self.root_dir): return
+        days = sorted(name for name in os.listdir(self.root_dir) if name.isdigit() and len(name) == 8 and start <= int(name) <= end)
+        for day in days:
+            for path in part_files(os.path.join(self.root_dir, day), stock_code):
+                with open(path, "r", encoding="utf-8", newline="") as f:
+                    f.readline()  # 파일마다 있는 헤더는 한 번만 내보냅니다.
+                    pending = ""
+                    while chunk := f.read(chunk_size):
+                        # 기록 중인 파일의 끝에 걸친 미완성 행은 내보내지 않습니다.
+                        chunk = pending + chunk
+                        cut = chunk.rfind("\n") + 1
+                        pending = chunk[cut:]
+                        if cut: yield chunk[:cut]
+
+    def snapshot_stats(self) -> dict:
+        return {**self.stats, "buffered": len(self.buffer), "open_files": len(self.writers), "fsync_policy": self.fsync}
@@ -0,0 +1,101 @@
+import json
+
+try:
+    import msgpack
+except ImportError:  # msgpack이 없으면 "msgpack" 형식 구독만 거부합니다.
+    msgpack = None
+
+from tick_hub import STOCK_TICK_TR_ID, INDEX_TICK_TR_ID
+
+# --- KIS 실시간 체결 메시지 파싱/인코딩 ---
+# KIS 원본 메시지("0|H0STCNT0|001|필드^필드^...")는 서버에서 한 번만 파싱하고,
+# 클라이언트에는 요청한 형식(raw/msgpack/delta)과 필드만 보냅니다.
+
+# 원본 메시지에서 꺼내는 필드 위치 (code, time, price, sign, change, changeRate, open, high, low, volume, accVolume, accTradeValue)
+STOCK_FIELD_INDEX = (0, 1, 2, 3, 4, 5, 7, 8, 9, 12, 13, 14)
+INDEX_FIELD_INDEX = (0, 1, 2, 3, 4, 9, 10, 11, 12, 7, 5, 6)
+
+TICK_FIELDS = ("time", "price", "change", "changeRate", "open", "high", "low", "volume", "accVolume", "accTradeValue")
+TICK_FORMATS = ("raw", "msgpack", "delta")
+
+
+class Tick:
+    __slots__ = ("tr_id", "code", "time", "price", "change", "changeRate", "open", "high", "low", "volume", "accVolume", "accTradeValue", "raw", "encoded")
+
+    def __init__(self, tr_id: str, raw: str, code: str, time: str, price: float, change: float, change_rate: float,
+                 open_price: float, high: float, low: float, volume: float, acc_volume: float, acc_trade_value: float):
+        self.tr_id = tr_id; self.raw = raw; self.code = code; self.time = time
+        self.price = price; self.change = change; self.changeRate = change_rate
+        self.open = open_price; self.high = high; self.low = low; self.volume = volume; self.accVolume = acc_volume; self.accTradeValue = acc_trade_value
+        # 같은 틱을 같은 형식으로 받는 클라이언트끼리 인코딩 결과를 공유합니다.
+        self.encoded: dict | None = None
+
+    def values(self, fields: tuple) -> list:
+        # 정수 값은 int로 보내 msgpack/JSON 모두에서 크기를 줄입니다.
+        return [_compact(getattr(self, field)) for field in fields]
+
+    def cached(self, key, encode):
+        if self.encoded is None: self.encoded = {}
+        payload = self.encoded.get(key)
+        if payload is None: payload = self.encoded[key] = encode()
+        return payload
+
+
+def _compact(value):
+    return int(value) if isinstance(value, float) and value.is_integer() else value
+
+
+def _to_float(value: str) -> float:
+    try: return float(value)
+    except ValueError: return 0.0
+
+
+def parse_ticks(msg: str) -> list[Tick]:
+    """KIS 실시간 메시지를 Tick 목록으로 변환합니다. 한 메시지에 여러 건이 묶여 올 수 있습니다."""
+    parts = msg.split("|", 3)
+    if len(parts) < 4: return []
+    tr_id = parts[1]
+    if tr_id == STOCK_TICK_TR_ID: positions = STOCK_FIELD_INDEX
+    elif tr_id == INDEX_TICK_TR_ID: positions = INDEX_FIELD_INDEX
+    else: return []
+    fields = parts[3].split("^")
+    count = int(parts[2]) if parts[2].isdigit() and int(parts[2]) > 0 else 1
+    width = len(fields) // count
+    if width <= max(positions): return []
+    ticks = []
+    for offset in range(0, width * count, width):
+        code, hhmmss, price, sign, change, rate, open_price, high, low, volume, acc_volume, acc_trade_value = (fields[offset + i] for i in positions)
+        change, rate = _to_float(change), _to_float(rate)
+        # 전일 대비 부호(4: 하한, 5: 하락)가 값에 반영되지 않은 경우 음수로 맞춥니다.
+        if sign in ("4", "5"): change, rate = -abs(change), -abs(rate)
+        # 여러 건이 묶인 메시지는 raw 형식 클라이언트를 위해 건별 원본 메시지로 나눕니다.
+        raw = msg if count == 1 else f"{parts[0]}|{tr_id}|001|" + "^".join(fields[offset:offset + width])
+        ticks.append(Tick(tr_id, raw, code, hhmmss, _to_float(price), change, rate, _to_float(open_price), _to_float(high), _to_float(low),
+                          _to_float(volume), _to_float(acc_volume), _to_float(acc_trade_value)))
+    return ticks
+
+
+class TickEncoder:
+    """클라이언트 한 명의 전송 형식. delta 형식은 마지막으로 보낸 값을 종목별로 기억합니다."""
+    def __init__(self, format: str = "raw", fields=None):
+        if format not in TICK_FORMATS: raise ValueError(f"지원하지 않는 형식: {format}")
+        if format == "msgpack" and msgpack is None: raise ValueError("서버에 msgpack이 설치되어 있지 않습니다.")
+        fields = tuple(field for field in (fields or TICK_FIELDS) if field in TICK_FIELDS)
+        self.format = format
+        self.fields = fields or TICK_FIELDS
+        self.last_sent: dict[str, list] = {}
+
+    def encode(self, tick: Tick) -> str | bytes:
+        if self.format == "raw":
+            # 기존 클라이언트 호환: KIS 원본 문자열을 그대로 감싸서 보냅니다.
+            return tick.cached("raw", lambda: json.dumps({"type": "tick", "trId": tick.tr_id, "code": tick.code, "data": tick.raw}))
+        if self.format == "msgpack":
+            # 바이너리 프레임: [코드, 필드값...] (필드 순서는 구독 응답의 fields와 같음)
+            return tick.cached(("msgpack", self.fields), lambda: msgpack.packb([tick.code, *tick.values(self.fields)]))
+        values = tick.values(self.fields)
+        previous = self.last_sent.get(tick.code)
+        self.last_sent[tick.code] = values
+        if previous is None:
+            return json.dumps({"type": "tick", "code": tick.code, "full": dict(zip(self.fields, values))}, separators=(",", ":"))
+        changed = {field: value for field, value, old in zip(self.fields, values, previous) if value != old}
+        return json.dumps({"type": "tick", "code": tick.code, "delta": changed}, separators=(",", ":"))
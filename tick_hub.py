@@ -0,0 +1,166 @@
+import asyncio
+import json
+import os
+
+import websockets
+
+# --- KIS 실시간 시세 허브 ---
+# 업스트림 KIS 웹소켓 연결 하나(또는 소수의 풀)를 모든 클라이언트가 공유합니다.
+# tr_key별 참조 카운트로 구독/해지를 관리하며, 재연결 시 현재 구독 목록을 다시 등록합니다.
+
+KIS_WS_MAX_SUBSCRIPTIONS = int(os.getenv("KIS_WS_MAX_SUBSCRIPTIONS", "40"))  # KIS 세션당 실시간 등록 한도(41건)보다 작게
+KIS_WS_MAX_CONNECTIONS = int(os.getenv("KIS_WS_MAX_CONNECTIONS", "4"))
+KIS_WS_RECONNECT_DELAY = float(os.getenv("KIS_WS_RECONNECT_DELAY", "5"))
+# 구독 응답의 msg_cd 중 Approval Key 자체가 거부된 경우. 이때는 키를 버리고 새 키로 다시 연결합니다.
+KIS_WS_AUTH_ERROR_CODES = {"OPSP0011", "OPSP0012"}
+
+STOCK_TICK_TR_ID = "H0STCNT0"  # 국내주식 실시간 체결가
+INDEX_TICK_TR_ID = "H0UPANC0"  # 국내업종 실시간 지수
+
+
+class HubCapacityError(Exception):
+    pass
+
+
+class UpstreamConnection:
+    def __init__(self, hub: "TickHub", conn_id: int):
+        self.hub = hub
+        self.conn_id = conn_id
+        self.subscriptions: set[tuple[str, str]] = set()
+        self.ws = None
+        self.approval_key: str | None = None
+        self.task: asyncio.Task | None = None
+
+    def start(self):
+        if self.task is None: self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try: await self.task
+            except asyncio.CancelledError: pass
+            self.task = None
+
+    async def send_request(self, approval_key: str, tr_id: str, tr_key: str, subscribe: bool):
+        msg = {"header": {"approval_key": approval_key, "custtype": "P", "tr_type": "1" if subscribe else "2", "content-type": "utf-8"}, "body": {"input": {"tr_id": tr_id, "tr_key": tr_key}}}
+        await self.ws.send(json.dumps(msg))
+        self.hub.stats["subscribe_requests" if subscribe else "unsubscribe_requests"] += 1
+
+    async def update(self, tr_id: str, tr_key: str, subscribe: bool):
+        # 연결 전이라면 run()에서 연결 직후 일괄 등록합니다.
+        if self.ws is None: return
+        try: await self.send_request(self.approval_key, tr_id, tr_key, subscribe)
+        except Exception as e: print(f"⚠️ [Hub#{self.conn_id}] 구독 요청 전송 실패 ({tr_id}/{tr_key}): {e}")
+
+    def handle_ack(self, msg: str) -> bool:
+        """구독/해지 응답을 확인합니다. Approval Key가 거부되었으면 False를 돌려 새 키로 다시 연결하게 합니다."""
+        try: data = json.loads(msg)
+        except ValueError: return True
+        header, body = data.get("header") or {}, data.get("body") or {}
+        key = (header.get("tr_id"), header.get("tr_key"))
+        if body.get("rt_cd", "0") == "0" or "ALREADY IN" in (body.get("msg1") or ""):
+            self.hub.rejected.pop(key, None); return True
+        msg_cd, msg1 = body.get("msg_cd") or "", body.get("msg1") or ""
+        self.hub.stats["subscribe_failures"] += 1
+        self.hub.rejected[key] = f"{msg_cd} {msg1}".strip()
+        print(f"⚠️ [Hub#{self.conn_id}] 실시간 등록 실패 ({key[0]}/{key[1]}): {msg_cd} {msg1}")
+        if msg_cd in KIS_WS_AUTH_ERROR_CODES or "approval" in msg1.lower():
+            if self.hub.invalidate_approval_key is not None: self.hub.invalidate_approval_key(self.approval_key)
+            return False
+        return True
+
+    async def run(self):
+        while True:
+            try:
+                self.approval_key = await self.hub.approval_key_provider()
+                async with websockets.connect(self.hub.ws_url, ping_interval=20, max_queue=None) as ws:
+                    self.ws = ws
+                    self.hub.stats["connects"] += 1
+                    print(f"📡 [Hub#{self.conn_id}] KIS WebSocket 연결, {len(self.subscriptions)}건 구독 등록")
+                    for tr_id, tr_key in list(self.subscriptions):
+                        await self.send_request(self.approval_key, tr_id, tr_key, True)
+                    async for msg in ws:
+                        if isinstance(msg, bytes): msg = msg.decode("utf-8", "replace")
+                        if msg and msg[0] in "01":
+                            await self.hub.dispatch(msg)
+                        elif "PINGPONG" in msg:
+                            await ws.send(msg)  # KIS 서버 PINGPONG은 그대로 돌려줘야 연결이 유지됩니다.
+                        elif msg.startswith("{") and not self.handle_ack(msg):
+                            await ws.close(); break
+            except asyncio.CancelledError:
+                self.ws = None; raise
+            except Exception as e:
+                print(f"⚠️ [Hub#{self.conn_id}] KIS WebSocket 오류, {self.hub.reconnect_delay}초 후 재연결: {e}")
+            self.ws = None
+            self.hub.stats["disconnects"] += 1
+            await asyncio.sleep(self.hub.reconnect_delay)
+
+
+class TickHub:
+    def __init__(self, ws_url: str, approval_key_provider, on_message, max_subscriptions: int = KIS_WS_MAX_SUBSCRIPTIONS,
+                 max_connections: int = KIS_WS_MAX_CONNECTIONS, reconnect_delay: float = KIS_WS_RECONNECT_DELAY, on_unsubscribe=None,
+                 invalidate_approval_key=None):
+        self.ws_url = ws_url
+        self.approval_key_provider = approval_key_provider
+        # on_message(tr_id, tr_key, raw): 수신한 실시간 메시지를 구독 클라이언트에게 전달하는 async 콜백
+        self.on_message = on_message
+        # on_unsubscribe(tr_id, tr_key): 마지막 구독자가 떠나 KIS 구독을 해제했을 때 호출됩니다.
+        self.on_unsubscribe = on_unsubscribe
+        # invalidate_approval_key(key): KIS가 Approval Key를 거부했을 때 캐시된 키를 버리도록 호출합니다.
+        self.invalidate_approval_key = invalidate_approval_key
+        self.max_subscriptions = max_subscriptions
+        self.max_connections = max_connections
+        self.reconnect_delay = reconnect_delay
+        self.connections: list[UpstreamConnection] = []
+        self.refcounts: dict[tuple[str, str], int] = {}
+        self.assigned: dict[tuple[str, str], UpstreamConnection] = {}
+        # 마지막 등록 요청이 거부된 (tr_id, tr_key) -> KIS 오류 메시지
+        self.rejected: dict[tuple[str, str], str] = {}
+        self.lock = asyncio.Lock()
+        self.stats = {"connects": 0, "disconnects": 0, "subscribe_requests": 0, "unsubscribe_requests": 0, "subscribe_failures": 0, "messages": 0}
+
+    def _connection_with_capacity(self) -> UpstreamConnection:
+        for conn in self.connections:
+            if len(conn.subscriptions) < self.max_subscriptions: return conn
+        if len(self.connections) >= self.max_connections:
+            raise HubCapacityError(f"실시간 구독 한도 초과 ({self.max_connections * self.max_subscriptions}건)")
+        conn = UpstreamConnection(self, len(self.connections)); self.connections.append(conn); conn.start()
+        return conn
+
+    async def subscribe(self, tr_id: str, tr_key: str):
+        key = (tr_id, tr_key)
+        async with self.lock:
+            if self.refcounts.get(key, 0) == 0:
+                conn = self._connection_with_capacity()
+                conn.subscriptions.add(key); self.assigned[key] = conn
+                await conn.update(tr_id, tr_key, True)
+            self.refcounts[key] = self.refcounts.get(key, 0) + 1
+
+    async def unsubscribe(self, tr_id: str, tr_key: str):
+        key = (tr_id, tr_key)
+        async with self.lock:
+            count = self.refcounts.get(key, 0)
+            if count == 0: return
+            if count > 1: self.refcounts[key] = count - 1; return
+            del self.refcounts[key]
+            self.rejected.pop(key, None)
+            conn = self.assigned.pop(key)
+            conn.subscriptions.discard(key)
+            if self.on_unsubscribe is not None: self.on_unsubscribe(tr_id, tr_key)
+            await conn.update(tr_id, tr_key, False)
+
+    async def dispatch(self, msg: str):
+        # 실시간 메시지 형식: "암호화여부|tr_id|건수|필드^필드^..." (첫 필드가 종목/업종 코드)
+        parts = msg.split("|", 3)
+        if len(parts) < 4: return
+        self.stats["messages"] += 1
+        tr_key = parts[3].split("^", 1)[0]
+        await self.on_message(parts[1], tr_key, msg)
+
+    async def stop(self):
+        for conn in self.connections: await conn.stop()
+        self.connections.clear()
+
+    def snapshot_stats(self) -> dict:
+        return {**self.stats, "upstream_connections": len(self.connections), "subscriptions": len(self.refcounts),
+                "connected": sum(1 for conn in self.connections if conn.ws is not None), "rejected": {f"{tr_id}/{tr_key}": reason for (tr_id, tr_key), reason in self.rejected.items()}}